@@ -1,12 +1,21 @@
+import functools
+
 import streamlit as st
 from PIL import Image
 
 
+# favicon decoded once per process instead of on every run. not a streamlit cache:
+# its spinner would send a delta before st.set_page_config, which must come first
+@functools.lru_cache(maxsize=None)
+def load_favicon():
+    im = Image.open("favicon.ico")
+    im.load()
+    return im
 
 
 def run():
     # favicon image
-    im = Image.open("favicon.ico")
+    im = load_favicon()
 
     st.set_page_config(
         page_title="Free Text Classification",
@@ -0,0 +1,86 @@
+"""Cold-start import profile of the Streamlit entry points.
+
+Runs the top-level imports of Home.py and every page in a fresh interpreter
+with ``python -X importtime`` and reports the cumulative import time of each
+script together with its slowest modules.
+
+    python benchmarks/import_time.py                # profile every script
+    python benchmarks/import_time.py --budget 1.5   # exit 1 if a script needs longer
+"""
+import argparse
+import ast
+import glob
+import os
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def entry_points():
+    return [os.path.join(ROOT, "Home.py")] + sorted(glob.glob(os.path.join(ROOT, "pages", "*.py")))
+
+
+def top_level_imports(path):
+    # import statements run when streamlit executes the script
+    with open(path, encoding="utf-8") as file:
+        tree = ast.parse(file.read())
+    imports = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    return "\n".join(ast.unparse(node) for node in imports)
+
+
+def profile(code):
+    # {module: cumulative seconds} of one cold interpreter running code
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # nested imports keep their indentation
+        modules[name[1:].rstrip()] = int(cumulative) / 1e6
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=float, help="maximum import seconds per script")
+    parser.add_argument("--top", type=int, default=8, help="slowest modules shown per script")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per script, the fastest is kept")
+    args = parser.parse_args()
+
+    # modules every interpreter loads at startup are not charged to the scripts
+    startup = set(profile("pass"))
+
+    failed = []
+    for path in entry_points():
+        name = os.path.relpath(path, ROOT)
+        code = top_level_imports(path)
+        try:
+            runs = [{module: seconds for module, seconds in profile(code).items() if module not in startup}
+                    for _ in range(args.repeat)]
+        except RuntimeError as error:
+            print(f"{name}: import failed ({error})")
+            failed.append(name)
+            continue
+        # top-level modules are the ones without leading indentation
+        totals = [sum(seconds for module, seconds in run.items() if not module.startswith(" ")) for run in runs]
+        fastest = runs[totals.index(min(totals))]
+        print(f"{name}: {min(totals):.3f}s")
+        slowest = sorted(fastest.items(), key=lambda item: item[1], reverse=True)[:args.top]
+        for module, seconds in slowest:
+            print(f"    {seconds:7.3f}s  {module.strip()}")
+        if args.budget is not None and min(totals) > args.budget:
+            failed.append(name)
+
+    if failed:
+        print(f"failed or over budget: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
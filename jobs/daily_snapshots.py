@@ -0,0 +1,66 @@
+"""Write the daily dashboard snapshots read by the Data Visualization page.
+
+Headless batch job for cron, runs without Streamlit. For every closed day in
+the window it queries the free text rows, derives them like the dashboard,
+joins them to the CRM through the phone index and writes the day's rollup
+cells, distinct phones and matched leads below DAILY_SNAPSHOT_DIR, together with
+the CRM time the lead status was read at. Days are rewritten on every run so
+CRM status changes within the window are picked up; older days keep the status
+of their last run and the dashboard labels them with that time. Size --days to
+cover the ranges users pick.
+
+    python -m jobs.daily_snapshots              # the 35 days up to yesterday
+    python -m jobs.daily_snapshots --days 90
+    python -m jobs.daily_snapshots --start 2026-09-01 --end 2026-09-30
+
+Google credentials come from the environment (GOOGLE_APPLICATION_CREDENTIALS).
+"""
+import argparse
+import datetime
+import logging
+
+from utils.bq import query_free_text
+from utils.crm import load_crm
+from utils.daily import DAILY_DIR, day_snapshot, write_day
+from utils.free_text import prepare_free_text
+from utils.phone_index import PhoneIndex
+from utils.shared import SharedFrame
+
+
+log = logging.getLogger("daily_snapshots")
+
+
+def run(start, end, directory=DAILY_DIR):
+    from google.cloud import bigquery
+
+    client = bigquery.Client()
+
+    crm = load_crm()
+    crm_updated_at = crm["last_update"].max()
+    crm_index = PhoneIndex(crm)
+    log.info("crm index holds %d leads", len(crm_index))
+
+    # one query for the whole window, sliced per day
+    free_text = SharedFrame(prepare_free_text(query_free_text(client, start, end)), date="create_date")
+    for day in [start + datetime.timedelta(days=offset) for offset in range((end - start).days + 1)]:
+        rows = free_text.view(start=day, end=day)
+        write_day(day, day_snapshot(rows, crm_index, crm_updated_at), directory)
+        log.info("%s: %d free text rows", day, len(rows))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--start", type=datetime.date.fromisoformat, help="first day (default: end - days + 1)")
+    parser.add_argument("--end", type=datetime.date.fromisoformat, help="last day (default: yesterday)")
+    parser.add_argument("--days", type=int, default=35, help="window length when --start is not given")
+    parser.add_argument("--directory", default=DAILY_DIR, help="snapshot directory, local or gs://")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    end = args.end or datetime.date.today() - datetime.timedelta(days=1)
+    start = args.start or end - datetime.timedelta(days=args.days - 1)
+    run(start, end, args.directory)
+
+
+if __name__ == "__main__":
+    main()
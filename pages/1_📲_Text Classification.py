@@ -1,19 +1,10 @@
 import streamlit as st
-import pandas as pd
-import json
 import datetime
-import requests
-import io
-from google.oauth2 import service_account
-from google.cloud import bigquery
-from st_aggrid import GridOptionsBuilder, AgGrid, GridUpdateMode, DataReturnMode
-import pandas_gbq
-from pandas.api.types import (
-    is_categorical_dtype,
-    is_datetime64_any_dtype,
-    is_numeric_dtype,
-    is_object_dtype,
-)
+from utils.bulk import BULK_TEMPLATE_URL, build_bulk_upload, read_template_columns
+from utils.export import download_on_demand
+from utils.grid import paged_grid
+from utils.integration import get_integration_data, integration_cache
+from utils.write_queue import get_write_queue
 
 st.set_page_config(layout="wide", page_title="Free Text Classification", page_icon="🎭")
 st.markdown("# Free Text Classification using Deep Learning")
@@ -21,16 +12,8 @@ st.markdown("__Max date is 30 days from today__")
 
 
 # Big QUERY
-# Create API client.
-credentials = service_account.Credentials.from_service_account_info(
-    st.secrets["gcp_service_account"]
-)
-client = bigquery.Client(credentials=credentials)
-
-
+# API clients come from utils.resources and are shared by every page and session of this process
 
-# endpoint
-url = 'https://majoo.id/api/report/integration?'
 
 
 # end date selection
@@ -66,65 +49,48 @@ if change_date:
     st.session_state["start"] = select_start_date
     st.session_state["end"] = select_end_date
 
-# creat function to fetch data
-st.cache(allow_output_mutation=True, ttl=30*60*60)
-def get_data():
-    res = requests.get(url + f'startdate={st.session_state["start"]}&' + f'enddate={st.session_state["end"]}')
-    dataframe = pd.DataFrame(res.json()['data'])
-
-    return dataframe
-
-
+# get dataframe, cached per (start, end) and shared by every session so grid
+# interactions never wait on the API
+df = get_integration_data(st.session_state["start"], st.session_state["end"])
 
-# get dataframe
-df = get_data()
+# cache counters
+cache_stats = integration_cache.stats()
+st.sidebar.caption(
+    f"API cache: {cache_stats['hits']} hits, {cache_stats['stale_hits']} stale, "
+    f"{cache_stats['misses']} misses, {cache_stats['bytes'] / 2**20:.1f} MB"
+)
 
 ############## AG GRID ###################
 
-# update and return mode
-return_mode_value = DataReturnMode.__members__["FILTERED"]
-update_mode_value = GridUpdateMode.__members__["GRID_CHANGED"]
-
 # title
 st.markdown('# Main Data')
 
-# grid options of AgGrid
-gb = GridOptionsBuilder.from_dataframe(df)
-gb.configure_selection(selection_mode='multiple', use_checkbox=True, groupSelectsChildren=True, groupSelectsFiltered=True)   
-gb.configure_pagination(enabled=True, paginationAutoPageSize=False, paginationPageSize=20)
-gridOptions = gb.build()    
-
-grid_response = AgGrid(
-    df, 
-    gridOptions=gridOptions,
-    data_return_mode=return_mode_value, 
-    update_mode=update_mode_value,
+# only the current page is sent to the browser, selection is tracked by lead id
+grid_response, selected_mask = paged_grid(
+    df,
+    key=f'main:{st.session_state["start"]}:{st.session_state["end"]}',
+    selectable=True,
     theme='streamlit')
 
 # title
 st.markdown('# Selected Data')
 
 # selected rows
-selected = pd.DataFrame(grid_response['selected_rows'])
+selected = df.loc[selected_mask].reset_index(drop=True)
 st.dataframe(selected)
 
-# csv format for bulk upload
-url_file = 'https://docs.google.com/spreadsheets/d/e/2PACX-1vRsEd3xRwST913ShSJWvQHfJukE9w3uxKUXKgEZS1p0Jfpdev7UOw2nH52phIUAi4eJNSeCDHf0PbHM/pub?output=csv'
-@st.cache(allow_output_mutation=True)
-def get_bulk_format(url):
-    df = pd.read_csv(url)
-    # inputting bulk format with data from selected rows
-    df['Outlet Name'] = pd.DataFrame(grid_response['selected_rows'])['business_name']
-    df['Nama PIC'] = pd.DataFrame(grid_response['selected_rows'])['name']
-    df['Email Address'] = pd.DataFrame(grid_response['selected_rows'])['email']
-    df['Phone Number'] = pd.DataFrame(grid_response['selected_rows'])['phone']
-    df['Notes'] = pd.DataFrame(grid_response['selected_rows'])['reason_need_majoo']
-    df['Sub Entry Source'] = pd.DataFrame(grid_response['selected_rows'])['campaign_name']
-    df['Entry Source'] = 'MARKETING-CAMPAIGN'
-    return df
+# csv format for bulk upload, the template header is refreshed every 6 hours
+@st.experimental_memo(ttl=6*60*60)
+def get_bulk_template(url):
+    return read_template_columns(url)
+
+# inputting bulk format with data from selected rows, keyed on the selection content
+@st.experimental_memo(max_entries=64)
+def get_bulk_format(template_columns, selected):
+    return build_bulk_upload(template_columns, selected)
 
 # run dataframe
-bulk_df = get_bulk_format(url_file)
+bulk_df = get_bulk_format(get_bulk_template(BULK_TEMPLATE_URL), selected)
 
 
 
@@ -132,48 +98,52 @@ bulk_df = get_bulk_format(url_file)
 st.markdown('# Downloadable Data')
 st.dataframe(bulk_df)
 
- # download the dataframe
-buffer = io.BytesIO()
-with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-    # Write excel with single worksheet
-    bulk_df.to_excel(writer, index=False)
-    # Close the Pandas Excel writer and output the Excel file to the buffer
-    writer.save()
-
-    # assign file to download button
-    st.download_button(
-        label="Download Data in Excel",
-        data=buffer,
-        file_name=f"enhanced-form_bulk-upload{datetime.datetime.now().strftime('%Y-%m-%d')}.xlsx",
-        mime="application/vnd.ms-excel"
-)
+# download the dataframe, the workbook is only built when requested and kept for this selection
+download_on_demand(
+    bulk_df,
+    file_name=f"enhanced-form_bulk-upload{datetime.datetime.now().strftime('%Y-%m-%d')}.xlsx",
+    key="bulk",
+    version=hash(df.index[selected_mask].to_numpy().tobytes()))
 
 
 #### UPLOAD TO BIGQUERY
 
+# background writer status
+write_status = get_write_queue().status()
+st.sidebar.markdown(" #### Save Status")
+st.sidebar.caption(
+    f"{write_status['queued']:,} queued, {write_status['in_flight']:,} in flight, "
+    f"{write_status['committed']:,} committed ({write_status['inserted']:,} new rows)"
+)
+if write_status['dead_letter']:
+    st.sidebar.warning(f"{write_status['dead_letter']:,} rows could not be saved, "
+                       f"their files are kept in {write_status['dead_letter_dir']}")
+if write_status['last_error']:
+    st.sidebar.caption(f"Last error: {write_status['last_error']}")
+
 ## Selected
 st.markdown('# Save Selected to Database')
-df_selected = selected
-df_selected['selected'] = 'yes'
-df_selected = df_selected.iloc[:,1:]
+df_selected = selected.assign(selected='yes')
 st.dataframe(df_selected)
 
 # button
 submit_selected = st.button('Save to DB', key='3')
 
 if submit_selected:
-    pandas_gbq.to_gbq(df_selected, "free_text_v3.all_status",
-              project_id="teak-advice-354202", if_exists="append", credentials=credentials)
+    # written in the background as an idempotent MERGE, leads already saved are skipped
+    get_write_queue().submit(df_selected)
+    st.success(f"Queued {len(df_selected):,} rows for saving")
 
 ## Not Selected
 st.markdown('# Save Non-Selected to Database')
-df_not_selected = df.loc[~df['business_name'].isin(df_selected['business_name'].tolist())].copy()
-df_not_selected['selected'] = 'no'
+# complement of the selection mask over the shared frame
+df_not_selected = df.loc[~selected_mask]
 st.dataframe(df_not_selected)
 
 # button
 submit_not_selected = st.button('Save to DB', key='4')
 
 if submit_not_selected:
-    pandas_gbq.to_gbq(df_not_selected, "free_text_v3.all_status",
-              project_id="teak-advice-354202", if_exists="append", credentials=credentials)
\ No newline at end of file
+    # written in the background as an idempotent MERGE, leads already saved are skipped
+    get_write_queue().submit(df_not_selected.assign(selected='no'))
+    st.success(f"Queued {len(df_not_selected):,} rows for saving")
\ No newline at end of file
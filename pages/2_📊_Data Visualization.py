@@ -1,138 +1,39 @@
 import streamlit as st
-import pandas as pd
-import json
 import datetime
-import requests
-import io
-from google.oauth2 import service_account
-from google.cloud import bigquery
-from st_aggrid import GridOptionsBuilder, AgGrid, GridUpdateMode, DataReturnMode
-import pandas_gbq
 import plotly.express as px
+from utils.bq import query_free_text
+from utils.cache import RequestCache
+from utils.crm import CRM_URL, load_crm
+from utils.daily import range_rollups
+from utils.dtypes import compaction_report
+from utils.free_text import prepare_free_text
+from utils.grid import paged_grid
+from utils.phone_index import PhoneIndex
+from utils.resources import get_bigquery_client, get_filesystem, get_read_backend
+from utils.shared import SharedDataset, SharedFrame
+from utils.shared_cache import SharedCache
 
 st.set_page_config(layout="wide", page_title="Free Text Analysis", page_icon="🎭")
 st.markdown("# Free Text Data Visualization")
 
-############ Big QUERY
-# Create API client.
-credentials = service_account.Credentials.from_service_account_info(
-    st.secrets["gcp_service_account"], scopes=["https://www.googleapis.com/auth/cloud-platform"]
-)
-client = bigquery.Client(credentials=credentials)
-
 ################## GCS
-@st.experimental_memo(ttl=24*60*60)
-def fetch_db_crm_1():
-        dates = ["submit_at", "assign_at", "approved_paid_at", "created_payment","last_update"]
-        dtypes = {
-            "mt_preleads_code": "category",
-            "mt_leads_code": "category",
-            "type": "category",
-            "campaign_name": "category",
-            "assigner": "category",
-            "email_sales": "category",
-            "m_status_code": "category",
-            "outlet_name": "category",
-            "owner_phone": "category",
-            "rating": "float32",
-            "pic_name": "category",
-            "full_name": "category",
-            "status": "uint8",
-            "m_sourceentry_code": "category",
-            "counter_followup": "float32",
-            "counter_meeting": "float32",
-            "channel_name": "category",
-            "reject_reason": "category",
-            "reject_note": "category"
-        }
-        
-        data = pd.read_csv("gs://lead-analytics-bucket/crm_db/leads_crm.csv",
-            storage_options={'token': credentials}, 
-            low_memory=False, 
-            parse_dates=dates, 
-            dtype=dtypes) # read data frame from csv file
-
-        dataframe = data
-
-        # normalize date
-        dataframe["submit_at"] = dataframe["submit_at"].dt.normalize()
-        dataframe["assign_at"] = dataframe["assign_at"].dt.normalize()
-        dataframe["approved_paid_at"] = dataframe["approved_paid_at"].dt.normalize()
-        dataframe["created_payment"] = dataframe["created_payment"].dt.normalize()
-        dataframe["last_update"] = dataframe["last_update"]
-
-        # cold, hot, warm
-        dataframe["leads_potensial_category"] = dataframe.apply(lambda row: 
-                                                                        "Cold Leads" if row["rating"] == 1 or row["rating"] == 0
-                                                                        else "Warm Leads" if row["rating"] == 2 or row["rating"] == 3
-                                                                        else "Hot Leads" if row["rating"] == 4 or row["rating"] == 5
-                                                                        else "Null", axis=1)
-        # hw by rating
-        dataframe["hw_by_rating"] = dataframe.apply(lambda row:
-                                                    "hw" if row["leads_potensial_category"] == "Warm Leads"
-                                                    else "hw" if row["leads_potensial_category"] == "Hot Leads"
-                                                    else "cold" if row["leads_potensial_category"] == "Cold Leads"
-                                                    else "Null", axis=1)
-
-
-        # unnassign, backlog, assigned, junked
-        dataframe["status_code"] = dataframe.apply(lambda row:
-                                                            "unassigned" if row["status"] == 1
-                                                            else "backlog" if row["status"] == 2
-                                                            else "assigned" if row["status"] == 3
-                                                            else "junked", axis=1)
-
-        # total activity
-        dataframe["total_activity"] = dataframe["counter_meeting"] + dataframe["counter_followup"]
-
-        # pipeline
-        dataframe["pipeline_by_activity"] = dataframe.apply(lambda row:
-                                                        "Pipeline Hot" if "INVOICE" in str(row["m_status_code"])
-                                                        else "Pipeline Hot" if row["leads_potensial_category"] == "Hot Leads"
-                                                        else "Pipeline Warm" if row["total_activity"] >=2
-                                                        else "Pipeline Cold" if row["total_activity"] <=1
-                                                        else "Pipeline Null", axis=1)
-
-        # hw by activity
-        dataframe["hw_by_activity"] = dataframe.apply(lambda row:
-                                                        "hw" if row["pipeline_by_activity"] == "Pipeline Hot"
-                                                        else "hw" if row["pipeline_by_activity"] == "Pipeline Warm"
-                                                        else "cold" if row["pipeline_by_activity"] == "Pipeline Cold"
-                                                        else "Null", axis=1)
-                                                                
-
-        # deal or no deal
-        dataframe["deal"] = dataframe.apply(lambda row: 
-                                                    "deal" if "PAYMENT" in str(row["m_status_code"])
-                                                    else "pipeline" if "INVOICE" in str(row["m_status_code"])
-                                                    else "deal" if row["m_status_code"] == "PAID"
-                                                    else "leads", axis=1)
-
-        
-
-        # filter only campaign and retouch
-        # dataframe = dataframe.loc[dataframe["type"] == "campaign"].copy()
+# API clients come from utils.resources and are shared by every page and session of this process
+# the crm source, its columns and the snapshot loader are configured in utils.crm
 
-        
-        
+# one read-only crm frame per process shared by every session, checked hourly.
+# through the shared cache backend only one replica rebuilds it, the others read its copy
+@st.experimental_singleton
+def crm_dataset():
+    store = SharedCache(lambda url: load_crm(filesystem=get_filesystem()), ttl=60*60, stale_ttl=60*60, namespace='crm')
+    return SharedDataset(lambda: store.get(CRM_URL), ttl=60*60, version=lambda frame: (len(frame), frame['last_update'].max()))
 
-        # remove duplicates
-        dataframe.drop_duplicates(subset=["mt_preleads_code"], inplace=True)
-        
-        return dataframe
+def fetch_db_crm_1():
+    return crm_dataset().get()
 
 ######################## CRM DATA FRAME #########################
 # run function
-df_all = fetch_db_crm_1()
-
-
-# formatting phone number
-df_all['owner_phone'] = df_all['owner_phone'].astype('str')
-df_all["owner_phone"] = df_all.apply(lambda row:
-                                                "62" + row["owner_phone"][:] if row["owner_phone"].startswith("8")
-                                                else row["owner_phone"].replace("0", "62", 1) if row["owner_phone"].startswith("0")
-                                                else row["owner_phone"].replace(row["owner_phone"][0:3], "62", 1) if row["owner_phone"].startswith("620")
-                                                else row["owner_phone"], axis=1)
+crm = fetch_db_crm_1()
+crm_updated_at = crm.derived('last_update', lambda frame: frame['last_update'].max())
 
 
 ################################ DATE RANGE SELECTION #################################
@@ -182,105 +83,97 @@ if change_date:
 
 
 ################################ FETCH DATA FROM BIGQUERY #################################
-query = 'SELECT * FROM `teak-advice-354202.free_text_v3.all_status` ORDER BY create_date DESC'
-# filter = f' WHERE create_date >=  {st.session_state["start_date"].strftime("%Y-%m-%d")} AND create_date <= {st.session_state["end_date"].strftime("%Y-%m-%d")}'
-# order = ' ORDER BY created_date DESC'
-# sql = query + filter + order
-
-@st.cache(allow_output_mutation=True, ttl=10*60*60)
-def get_bigquery():
-    df = pandas_gbq.read_gbq(query, project_id="teak-advice-354202", credentials=credentials)
-
-    return df
-
-# run get_bigquery
-dataframe = get_bigquery()
-
-# data manipulation
-dataframe['campaign_source'] = dataframe.apply(lambda row: 
-                                'google' if str(row['campaign_name']).startswith('ggl')
-                                else 'tiktok' if str(row['campaign_name']).startswith('regtiktok')
-                                else 'facebook' if str(row['campaign_name']).startswith('reg')
-                                else 'undefined', axis=1
-                            )
-
-df_filtered = dataframe.loc[(pd.to_datetime(dataframe['create_date']).dt.date >= st.session_state['start_date']) & (pd.to_datetime(dataframe['create_date']).dt.date <= st.session_state['end_date'])]
-df_filtered['create_date'] = pd.to_datetime(df_filtered['create_date'], errors='coerce')
-df_filtered['create_date'] = df_filtered['create_date'].dt.normalize()
-
-
-
-# formatting phone number
-df_filtered['phone'] = df_filtered['phone'].astype('str')
-df_filtered["phone"] = df_filtered.apply(lambda row:
-                                                "62" + row["phone"][:] if row["phone"].startswith("8")
-                                                else row["phone"].replace("0", "62", 1) if row["phone"].startswith("0")
-                                                else row["phone"].replace(row["phone"][0:3], "62", 1) if row["phone"].startswith("620")
-                                                else row["phone"], axis=1)
-
-# adset
-df_filtered['adset'] = df_filtered.apply(lambda row: 
-                                        row['campaign_name'].split('-')[1] if row['campaign_source'] == 'google'
-                                        else row['campaign_name'].split('-')[0], axis=1
-                                    )
-
-# remove undefined 
-df_filtered = df_filtered.loc[df_filtered['campaign_source'] != 'undefined'].copy()
-
-# length of filtered data
-len_filtered = len(df_filtered)
-# lenght of unique numbers
-len_unique = df_filtered['phone'].nunique()
+# only the selected date range and the dashboard columns are scanned, cached per range.
+# results are downloaded as arrow batches over parallel storage read streams
+def query_and_prepare(date_range):
+    df = query_free_text(get_bigquery_client(), *date_range, backend=get_read_backend())
+
+    # campaign source, adset and phone are derived once per range
+    return prepare_free_text(df)
+
+# prepared ranges are stored in the shared cache backend, so a range is queried once for every replica
+@st.experimental_singleton
+def free_text_store():
+    return SharedCache(query_and_prepare, ttl=10*60*60, namespace='free_text')
+
+def load_free_text(date_range):
+    # rows are sorted by create_date, newest first, so any range of days inside it is a slice
+    return SharedFrame(free_text_store().get(date_range), date='create_date')
+
+# read-only free text frames per date range, shared by every session
+@st.experimental_singleton
+def free_text_cache():
+    return RequestCache(load_free_text, ttl=10*60*60, max_bytes=1024**3,
+                        sizeof=lambda shared: int(shared.view().memory_usage(deep=True).sum()))
+
+def get_bigquery(start_date, end_date):
+    # a cached range covering the selected one is sliced instead of queried again
+    cache = free_text_cache()
+    for cached_start, cached_end in reversed(cache.keys()):
+        if cached_start <= start_date and end_date <= cached_end:
+            shared = cache.lookup((cached_start, cached_end))
+            if shared is not None:
+                return shared
+    return cache.get((start_date, end_date))
 
 ############### AG GRID ################
-# update and return mode
-return_mode_value = DataReturnMode.__members__["FILTERED"]
-update_mode_value = GridUpdateMode.__members__["GRID_CHANGED"]
+# the raw rows of the whole range are only queried when asked for, the metrics
+# and charts below come from the daily snapshots
+if st.checkbox('Show raw free text rows', key='filtered:show'):
+    # run get_bigquery, a session only holds a shallow view of the days it selected
+    df_filtered = get_bigquery(st.session_state['start_date'], st.session_state['end_date']).view(
+        start=st.session_state['start_date'], end=st.session_state['end_date'])
 
-# grid options of AgGrid
-gb = GridOptionsBuilder.from_dataframe(df_filtered)
-gb.configure_pagination(enabled=True, paginationAutoPageSize=False, paginationPageSize=20)
-gridOptions = gb.build()    
-
-grid_response = AgGrid(
-    df_filtered, 
-    gridOptions=gridOptions,
-    data_return_mode=return_mode_value, 
-    update_mode=update_mode_value,
-    theme='streamlit')
-
-
-
-
-df_filtered_grouped = df_filtered.groupby(['campaign_source','adset', 'selected'])['phone'].count().to_frame().reset_index()
-df_filtered_grouped.columns = ['campaign_source', 'adset', 'selected', 'count']
+    # only the current page is sent to the browser
+    grid_response, _ = paged_grid(
+        df_filtered,
+        key=f'filtered:{st.session_state["start_date"]}:{st.session_state["end_date"]}',
+        theme='streamlit')
 
 
 ############################### MERGE CRM AND FREE TEXT DATA #############################
-# slicing crm data based on date filtered
-df_all_slice = df_all.loc[(df_all['submit_at'].dt.date >= st.session_state['start_date']) & (df_all['submit_at'].dt.date <= st.session_state['end_date']), ['mt_leads_code', 'owner_phone', 'm_status_code', 'deal']].copy()
-
+# every chart and metric is answered from two rollup cubes. closed days are read
+# from the daily snapshots written by `python -m jobs.daily_snapshots` (cron),
+# only today and days without a snapshot are queried and joined to the crm live
+@st.experimental_memo(ttl=60*60)
+def get_rollups(start_date, end_date, crm_version):
+    return range_rollups(
+        start_date, end_date,
+        free_text=lambda first, last: get_bigquery(first, last),
+        # phone -> lead index kept with the shared crm frame, built once per snapshot
+        phone_index=lambda: fetch_db_crm_1().derived('phone_index', PhoneIndex),
+        filesystem=get_filesystem())
+
+free_text_cube, crm_cube, len_unique, snapshot_crm_updated_at = get_rollups(st.session_state['start_date'], st.session_state['end_date'], crm.version)
+
+# memory saved by the dtype planner of every loader in this process
+with st.sidebar.expander("Memory"):
+    for name, (before, after) in compaction_report().items():
+        st.caption(f"{name}: {before / 2**20:,.1f} MB -> {after / 2**20:,.1f} MB")
+
+# closed days carry the lead status of the crm data the snapshot job read
+crm_status_caption = f"CRM Data Updated At: {crm_updated_at}"
+if snapshot_crm_updated_at is not None:
+    crm_status_caption = (f"Lead status of days up to yesterday as of {snapshot_crm_updated_at} (daily snapshots), "
+                          f"today as of {crm_updated_at}")
 
-# merge dataframe
-df_merged = pd.merge(df_filtered, df_all_slice, how='left', right_on='owner_phone', left_on='phone')
-# remove duplicates on mt_leads_code
-df_merged.drop_duplicates(subset=['mt_leads_code'], inplace=True)
-# remove null values
-df_merged = df_merged.loc[df_merged['mt_leads_code'].notnull()].copy()
+# length of filtered data
+len_filtered = free_text_cube.total()
 # length of merged data (into CRM)
-len_crm = len(df_merged)
+len_crm = crm_cube.total()
 # length of deal data
-len_deal = len(df_merged.loc[df_merged['deal'] == 'deal'])
+len_deal = crm_cube.total(deal='deal')
 # length of pipeline
-len_pipeline = len(df_merged.loc[df_merged['deal'] == 'pipeline'])
+len_pipeline = crm_cube.total(deal='pipeline')
+
+df_filtered_grouped = free_text_cube.group(['campaign_source', 'adset', 'selected'])
 
 ####### DATAFRAME I
-df_merged_grouped = df_merged.groupby(['adset', 'selected', 'm_status_code'])['mt_leads_code'].count().to_frame().reset_index()
+df_merged_grouped = crm_cube.group(['adset', 'selected', 'm_status_code'])
 df_merged_grouped.columns = ['adset', 'selected', 'status', 'count']
 
 ####### DATAFRAME II
-df_merged_grouped_deal = df_merged.groupby(['adset', 'selected', 'deal'])['mt_leads_code'].count().to_frame().reset_index()
-df_merged_grouped_deal.columns = ['adset', 'selected', 'deal', 'count']
+df_merged_grouped_deal = crm_cube.group(['adset', 'selected', 'deal'])
 
 ######################## DATA VISUALIZATION #########################
 st.markdown("# Campaign Performance")
@@ -314,8 +207,8 @@ sunburst_fig_adset.update_traces(textinfo="label+percent parent", textfont_size=
 st.plotly_chart(sunburst_fig_adset, use_container_width=True)
 
 ############### SUNBURST SECTION PART 3 #############
-st.subheader("Sunburst Visualization (Current Lead Status)")
-st.write(f"CRM Data Updated At: {df_all.sort_values(by='last_update', ascending=False).iloc[0]['last_update']}")
+st.subheader("Sunburst Visualization (Lead Status)")
+st.write(crm_status_caption)
 sunburst_fig_status = px.sunburst(df_merged_grouped, path=['adset', 'status'], values='count', title=f'Date range from {st.session_state["start_date"]} to {st.session_state["end_date"]}', 
                             color_discrete_sequence=px.colors.qualitative.Pastel2, width=600, height=600)
 
@@ -324,7 +217,7 @@ st.plotly_chart(sunburst_fig_status, use_container_width=True)
 
 ############### SUNBURST SECTION PART 4 #############
 st.subheader("Sunburst Visualization (Deal Status)")
-st.write(f"CRM Data Updated At: {df_all.sort_values(by='last_update', ascending=False).iloc[0]['last_update']}")
+st.write(crm_status_caption)
 
 sunburst_fig_deal = px.sunburst(df_merged_grouped_deal, path=['adset', 'deal'], values='count', title=f'Date range from {st.session_state["start_date"]} to {st.session_state["end_date"]}', 
                             color_discrete_sequence=px.colors.qualitative.Pastel2, width=600, height=600)
@@ -334,7 +227,7 @@ st.plotly_chart(sunburst_fig_deal, use_container_width=True)
 
 ############### LINE CHART SECTION #############
 st.subheader("Daily Counts All Leads")
-daily_grouped = df_filtered.groupby(['create_date', 'campaign_source', 'selected'])['phone'].count().to_frame().reset_index()
+daily_grouped = free_text_cube.group(['create_date', 'campaign_source', 'selected'])
 
 # rename columns
 daily_grouped.columns = ['date', 'campaign_source', 'selected', 'count']
@@ -375,7 +268,7 @@ st.plotly_chart(daily_fig, use_container_width=True)
 ############### LINE CHART SECTION #############
 st.subheader("Daily Counts By Selected")
 
-daily_grouped_all = df_filtered.groupby(['create_date', 'selected'])['phone'].count().to_frame().reset_index()
+daily_grouped_all = free_text_cube.group(['create_date', 'selected'])
 # rename columns
 daily_grouped_all.columns = ['date', 'selected', 'count']
 
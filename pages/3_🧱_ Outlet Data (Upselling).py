@@ -1,104 +1,127 @@
 import streamlit as st
-import pandas as pd
-import json
 import datetime
-import requests
-import io
-from google.oauth2 import service_account
-from google.cloud import bigquery
-from st_aggrid import GridOptionsBuilder, AgGrid, GridUpdateMode, DataReturnMode
-import pandas_gbq
-import plotly.express as px
+from utils.cache import RequestCache
+from utils.export import download_on_demand
+from utils.grid import paged_grid
+from utils.outlet import column_options, column_range, load_outlet_snapshot, outlet_columns, read_outlet
+from utils.resources import get_filesystem
+from utils.shared import SharedFrame
 
 st.set_page_config(layout="wide", page_title="Outlet Data for Upselling", page_icon="🛒")
-st.markdown("# This page is disabled temporarily")
-
-# # Big QUERY and GCS Client
-# # Create API client.
-# credentials = service_account.Credentials.from_service_account_info(st.secrets["gcp_service_account"], scopes=["https://www.googleapis.com/auth/cloud-platform"])
-# client = bigquery.Client(credentials=credentials)
-
-# @st.experimental_memo(ttl=24*60*60)
-# def get_outlet_data():
-#     dataframe = pd.read_csv("gs://lead-analytics-bucket/crm_db/outlet_data.csv",
-#         storage_options={'token': credentials})
-#     dataframe = dataframe.iloc[:, 1:].copy()
-    
-#     return dataframe
-
-# # run dataframe
-# dataframe = get_outlet_data()
-
-# # Explanation
-# with st.expander("How to filter the data"):
-#         st.markdown(
-#             """
-#             Steps:
-        
-#             __1. Select necessary columns__
-            
-#             To focus on filtering the data, just select the needed columns and unselect others
-            
-#             __2. Filter each column:__
-            
-#             Narrow down the selected data by filtering the required criterias
-            
-#             __3. Download data:__
-            
-#             After finished, do not forget to download for further processing
-            
-        
-#         """
-#         )
-
-# ############## AG GRID ###################
-
-# # update and return mode
-# return_mode_value = DataReturnMode.__members__["FILTERED"]
-# update_mode_value = GridUpdateMode.__members__["GRID_CHANGED"]
-
-# # grid options of AgGrid
-# gb = GridOptionsBuilder.from_dataframe(dataframe)
-# gb.configure_selection(selection_mode='multiple', use_checkbox=True, groupSelectsChildren=True, groupSelectsFiltered=True)
-# gb.configure_default_column(enablePivot=True, enableValue=True, enableRowGroup=True)   
-# gb.configure_pagination(enabled=True, paginationAutoPageSize=False, paginationPageSize=20)
-# gridOptions = gb.build()    
-
-# grid_response = AgGrid(
-#     dataframe, 
-#     gridOptions=gridOptions,
-#     enable_enterprise_modules=True,
-#     update_mode=GridUpdateMode.MODEL_CHANGED,
-#     data_return_mode=DataReturnMode.FILTERED_AND_SORTED,
-#     fit_columns_on_grid_load=False,
-#     header_checkbox_selection_filtered_only=True,
-#     use_checkbox=True,
-#     theme='streamlit')
-
-
-
-# # title
-# st.markdown('# Selected Data')
-
-# # selected rows
-# df_selected = pd.DataFrame(grid_response['selected_rows'])
-# st.dataframe(df_selected)
-
-# # title
-# st.markdown('# Downloadable Data')
-
-# # download the dataframe
-# buffer = io.BytesIO()
-# with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-#     # Write excel with single worksheet
-#     df_selected.to_excel(writer, index=False)
-#     # Close the Pandas Excel writer and output the Excel file to the buffer
-#     writer.save()
-
-#     # assign file to download button
-#     st.download_button(
-#         label="Download Data in Excel",
-#         data=buffer,
-#         file_name=f"outlet_data_for_upsell_{datetime.datetime.now().strftime('%Y-%m-%d')}.xlsx",
-#         mime="application/vnd.ms-excel"
-# )
\ No newline at end of file
+st.markdown("# Outlet Data for Upselling")
+
+# GCS client comes from utils.resources and is shared by every page and session of this process
+
+# the csv is streamed in chunks into a local parquet snapshot once per GCS generation,
+# checked hourly. the path changes with the snapshot so everything keyed on it refreshes
+@st.experimental_memo(ttl=60*60)
+def get_outlet_snapshot():
+    return load_outlet_snapshot(filesystem=get_filesystem())
+
+@st.experimental_memo
+def get_outlet_columns(path):
+    return outlet_columns(path)
+
+@st.experimental_memo
+def get_column_range(path, column):
+    return column_range(path, column)
+
+@st.experimental_memo
+def get_column_options(path, column):
+    return column_options(path, column)
+
+# only the selected columns of the rows matching the filters are read from the snapshot.
+# results are read-only frames shared by every session, bounded by their size
+@st.experimental_singleton
+def outlet_cache():
+    return RequestCache(lambda key: SharedFrame(read_outlet(*key)), ttl=60*60, max_bytes=512*1024**2,
+                        sizeof=lambda shared: int(shared.view().memory_usage(deep=True).sum()))
+
+def get_outlet_data(path, columns, filters):
+    # a session only holds a shallow view of the shared frame
+    return outlet_cache().get((path, columns, filters)).view()
+
+# run dataframe
+path = get_outlet_snapshot()
+columns = get_outlet_columns(path)
+
+# Explanation
+with st.expander("How to filter the data"):
+        st.markdown(
+            """
+            Steps:
+
+            __1. Select necessary columns__
+
+            To focus on filtering the data, just select the needed columns and unselect others
+
+            __2. Filter each column:__
+
+            Narrow down the selected data by filtering the required criterias
+
+            __3. Download data:__
+
+            After finished, do not forget to download for further processing
+
+
+        """
+        )
+
+############## FILTERS ###################
+
+# selected columns
+selected_columns = st.multiselect("Columns", list(columns), default=list(columns))
+
+# filters of the selected columns, only applied when narrowed down
+filters = []
+with st.expander("Filter columns", expanded=True):
+    for column in selected_columns:
+        if columns[column] == "number":
+            bounds = get_column_range(path, column)
+            if bounds is None or bounds[0] == bounds[1]:
+                continue
+            low, high = st.slider(column, min_value=float(bounds[0]), max_value=float(bounds[1]),
+                                  value=(float(bounds[0]), float(bounds[1])), key=f"outlet:filter:{column}")
+            if (low, high) != (float(bounds[0]), float(bounds[1])):
+                filters.append((column, "between", (low, high)))
+        else:
+            options = get_column_options(path, column)
+            if options is None:
+                # too many distinct values for a list, match a part of the text instead
+                text = st.text_input(column, key=f"outlet:filter:{column}")
+                if text:
+                    filters.append((column, "contains", text))
+            else:
+                values = st.multiselect(column, options, key=f"outlet:filter:{column}")
+                if values:
+                    filters.append((column, "in", tuple(values)))
+
+dataframe = get_outlet_data(path, tuple(selected_columns), tuple(filters))
+
+############## AG GRID ###################
+
+# only the current page is sent to the browser, selection is kept per filter result
+grid_response, selected_mask = paged_grid(
+    dataframe,
+    key=f"outlet:{hash((path, tuple(selected_columns), tuple(filters)))}",
+    selectable=True,
+    theme='streamlit')
+
+
+
+# title
+st.markdown('# Selected Data')
+
+# selected rows
+df_selected = dataframe.loc[selected_mask].reset_index(drop=True)
+st.dataframe(df_selected)
+
+# title
+st.markdown('# Downloadable Data')
+
+# download the dataframe, the workbook is only built when requested and kept for this selection
+download_on_demand(
+    df_selected,
+    file_name=f"outlet_data_for_upsell_{datetime.datetime.now().strftime('%Y-%m-%d')}.xlsx",
+    key="outlet",
+    version=hash((path, tuple(selected_columns), tuple(filters), dataframe.index[selected_mask].to_numpy().tobytes())))
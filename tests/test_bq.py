@@ -0,0 +1,88 @@
+import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from utils.bq import InMemoryReadBackend, arrow_to_frame, read_table
+
+
+def free_text_table(rows):
+    return pa.table({
+        "create_date": [f"2022-10-{day % 28 + 1:02d} 08:00:00" for day in range(rows)],
+        "campaign_name": [f"ggl-{row % 3}" for row in range(rows)],
+        "phone": [f"62{row}" for row in range(rows)],
+        "selected": ["yes" if row % 2 else None for row in range(rows)],
+    })
+
+
+@pytest.mark.parametrize("max_streams", [1, 3, 8])
+def test_streams_assemble_in_order(max_streams):
+    table = free_text_table(1_000)
+    result = read_table(InMemoryReadBackend(table, batch_size=64), table=None, parent_project="test", max_streams=max_streams)
+    assert result.equals(table)
+
+
+def test_empty_table_reads_none():
+    assert read_table(InMemoryReadBackend(free_text_table(0)), table=None, parent_project="test") is None
+
+
+def test_arrow_to_frame_types():
+    frame = arrow_to_frame(free_text_table(10))
+    assert frame["create_date"].dtype == "datetime64[ns]"
+    assert frame["create_date"].iloc[0] == pd.Timestamp("2022-10-01 08:00:00")
+    assert pd.api.types.is_categorical_dtype(frame["campaign_name"])
+    assert frame["selected"].isna().sum() == 5
+
+    # unparseable dates stay as they are
+    frame = arrow_to_frame(pa.table({"create_date": ["not a date"]}))
+    assert list(frame["create_date"]) == ["not a date"]
+
+
+def test_query_free_text_reads_destination_table():
+    bigquery = pytest.importorskip("google.cloud.bigquery")
+    from utils.bq import query_free_text
+
+    class Job:
+        destination = None
+
+        def result(self):
+            return None
+
+    class Client:
+        project = "test"
+
+        def get_table(self, table):
+            return bigquery.Table(table, schema=[bigquery.SchemaField("create_date", "DATE")])
+
+        def query(self, sql, job_config=None):
+            self.parameters = job_config.query_parameters
+            return Job()
+
+    client = Client()
+    frame = query_free_text(client, datetime.date(2022, 10, 1), datetime.date(2022, 10, 31),
+                            backend=InMemoryReadBackend(free_text_table(100)))
+    assert len(frame) == 100
+    assert frame["create_date"].dtype == "datetime64[ns]"
+    assert [(parameter.type_, parameter.value) for parameter in client.parameters] == [
+        ("DATE", datetime.date(2022, 10, 1)), ("DATE", datetime.date(2022, 11, 1))]
+
+
+@pytest.mark.parametrize("date_type, start", [
+    ("TIMESTAMP", datetime.datetime(2022, 10, 1, tzinfo=datetime.timezone.utc)),
+    ("DATETIME", datetime.datetime(2022, 10, 1)),
+    ("DATE", datetime.date(2022, 10, 1)),
+    ("STRING", "2022-10-01"),
+])
+def test_date_filter_compares_the_column_itself(date_type, start):
+    pytest.importorskip("google.cloud.bigquery")
+    from utils.bq import build_free_text_query
+
+    sql, (low, high) = build_free_text_query(datetime.date(2022, 10, 1), datetime.date(2022, 10, 2), date_type=date_type)
+    # no function around create_date, so BigQuery can prune partitions and clusters
+    assert "create_date >= @start_date AND create_date < @end_date" in sql
+    assert (low.type_, low.value) == (date_type, start)
+    if date_type == "STRING":
+        assert high.value == "2022-10-03"
+    else:
+        assert high.value - low.value == datetime.timedelta(days=2)
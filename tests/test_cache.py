@@ -0,0 +1,68 @@
+import threading
+import time
+
+from utils.cache import RequestCache
+
+
+def counting_loader(delay=0):
+    calls = []
+
+    def load(key):
+        calls.append(key)
+        time.sleep(delay)
+        return f"{key}:{len(calls)}"
+
+    return load, calls
+
+
+def test_hit_stale_and_miss_counts():
+    load, calls = counting_loader()
+    cache = RequestCache(load, ttl=0.2, stale_ttl=10)
+
+    assert cache.get("a") == "a:1"
+    assert cache.get("a") == "a:1"
+    time.sleep(0.25)
+    # expired but within the stale window: served at once and reloaded in the background
+    assert cache.get("a") == "a:1"
+    for _ in range(100):
+        if len(calls) == 2 and cache.keys():
+            break
+        time.sleep(0.01)
+    assert cache.get("a") == "a:2"
+
+    stats = cache.stats()
+    assert (stats["misses"], stats["stale_hits"]) == (1, 1)
+    assert stats["hits"] >= 2
+    assert calls == ["a", "a"]
+
+
+def test_expired_entry_is_reloaded():
+    load, calls = counting_loader()
+    cache = RequestCache(load, ttl=0.05)
+    cache.get("a")
+    time.sleep(0.1)
+    assert cache.get("a") == "a:2"
+    assert cache.stats()["misses"] == 2
+
+
+def test_concurrent_misses_load_once():
+    load, calls = counting_loader(delay=0.2)
+    cache = RequestCache(load, ttl=60)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("a"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == ["a"]
+    assert results == ["a:1"] * 8
+
+
+def test_max_bytes_evicts_least_recently_used():
+    cache = RequestCache(lambda key: key, ttl=60, max_bytes=2, sizeof=lambda value: 1)
+    cache.get("a")
+    cache.get("b")
+    cache.get("a")
+    cache.get("c")
+    assert cache.keys() == ["a", "c"]
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+from utils.crm import derive_lead_columns
+
+
+def reference_lead_columns(dataframe):
+    # the row-wise lambdas derive_lead_columns replaced
+    dataframe["leads_potensial_category"] = dataframe.apply(lambda row:
+                                                            "Cold Leads" if row["rating"] == 1 or row["rating"] == 0
+                                                            else "Warm Leads" if row["rating"] == 2 or row["rating"] == 3
+                                                            else "Hot Leads" if row["rating"] == 4 or row["rating"] == 5
+                                                            else "Null", axis=1)
+    dataframe["hw_by_rating"] = dataframe.apply(lambda row:
+                                                "hw" if row["leads_potensial_category"] == "Warm Leads"
+                                                else "hw" if row["leads_potensial_category"] == "Hot Leads"
+                                                else "cold" if row["leads_potensial_category"] == "Cold Leads"
+                                                else "Null", axis=1)
+    dataframe["status_code"] = dataframe.apply(lambda row:
+                                               "unassigned" if row["status"] == 1
+                                               else "backlog" if row["status"] == 2
+                                               else "assigned" if row["status"] == 3
+                                               else "junked", axis=1)
+    dataframe["total_activity"] = dataframe["counter_meeting"] + dataframe["counter_followup"]
+    dataframe["pipeline_by_activity"] = dataframe.apply(lambda row:
+                                                        "Pipeline Hot" if "INVOICE" in str(row["m_status_code"])
+                                                        else "Pipeline Hot" if row["leads_potensial_category"] == "Hot Leads"
+                                                        else "Pipeline Warm" if row["total_activity"] >= 2
+                                                        else "Pipeline Cold" if row["total_activity"] <= 1
+                                                        else "Pipeline Null", axis=1)
+    dataframe["hw_by_activity"] = dataframe.apply(lambda row:
+                                                  "hw" if row["pipeline_by_activity"] == "Pipeline Hot"
+                                                  else "hw" if row["pipeline_by_activity"] == "Pipeline Warm"
+                                                  else "cold" if row["pipeline_by_activity"] == "Pipeline Cold"
+                                                  else "Null", axis=1)
+    dataframe["deal"] = dataframe.apply(lambda row:
+                                        "deal" if "PAYMENT" in str(row["m_status_code"])
+                                        else "pipeline" if "INVOICE" in str(row["m_status_code"])
+                                        else "deal" if row["m_status_code"] == "PAID"
+                                        else "leads", axis=1)
+    return dataframe
+
+
+def crm_frame(rows=2_000, seed=0):
+    rng = np.random.default_rng(seed)
+    statuses = ["PAID", "WAITING PAYMENT", "INVOICE SENT", "NEW", "INVOICE PAYMENT", "paid", None]
+    frame = pd.DataFrame({
+        # out of range, fractional and missing ratings
+        "rating": rng.choice([0, 1, 2, 3, 4, 5, 6, -1, 2.5, np.nan], rows).astype("float32"),
+        # statuses without a status code
+        "status": rng.choice([0, 1, 2, 3, 4, 9], rows).astype("uint8"),
+        "m_status_code": pd.Categorical(rng.choice(np.array(statuses, dtype=object), rows)),
+        "counter_meeting": rng.choice([0, 1, 2, np.nan], rows).astype("float32"),
+        "counter_followup": rng.choice([0, 1, 3, np.nan], rows).astype("float32"),
+    })
+    frame.loc[:9, "m_status_code"] = None
+    return frame
+
+
+DERIVED = ["leads_potensial_category", "hw_by_rating", "status_code", "pipeline_by_activity", "hw_by_activity", "deal"]
+
+
+def test_matches_row_wise_reference():
+    frame = crm_frame()
+    expected = reference_lead_columns(frame.copy())
+    result = derive_lead_columns(frame.copy())
+
+    for column in DERIVED:
+        pd.testing.assert_series_equal(result[column].astype(object), expected[column].astype(object), check_names=False)
+    pd.testing.assert_series_equal(result["total_activity"], expected["total_activity"])
+
+
+def test_missing_status_code_and_rating():
+    frame = pd.DataFrame({
+        "rating": np.array([np.nan, 7], dtype="float32"),
+        "status": np.array([0, 5], dtype="uint8"),
+        "m_status_code": pd.Categorical([None, None], categories=["PAID"]),
+        "counter_meeting": np.array([np.nan, 1], dtype="float32"),
+        "counter_followup": np.array([1, 0], dtype="float32"),
+    })
+    result = derive_lead_columns(frame)
+
+    assert list(result["leads_potensial_category"]) == ["Null", "Null"]
+    assert list(result["hw_by_rating"]) == ["Null", "Null"]
+    assert list(result["status_code"]) == ["junked", "junked"]
+    assert list(result["pipeline_by_activity"]) == ["Pipeline Null", "Pipeline Cold"]
+    assert list(result["hw_by_activity"]) == ["Null", "cold"]
+    assert list(result["deal"]) == ["leads", "leads"]
@@ -0,0 +1,128 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.daily import closed_days, day_snapshot, range_rollups, read_days, write_day
+from utils.free_text import prepare_free_text
+from utils.phone_index import PhoneIndex
+from utils.shared import SharedFrame
+
+
+def baseline_merge(free_text, crm, start, end):
+    # the dashboard merge before the phone index: rows newest first, crm sliced on submit_at
+    crm = crm.loc[(crm["submit_at"] >= pd.Timestamp(start)) & (crm["submit_at"] < pd.Timestamp(end) + pd.Timedelta(days=1))]
+    merged = free_text.merge(crm, how="left", left_on="phone", right_on="owner_phone")
+    merged = merged.drop_duplicates(subset=["mt_leads_code"])
+    return merged.loc[merged["mt_leads_code"].notnull()]
+
+
+def test_closed_and_live_days_match_the_baseline_merge(tmp_path):
+    rng = np.random.default_rng(1)
+    today = datetime.date.today()
+    first = today - datetime.timedelta(days=6)
+    phones = [f"8123{i:04d}" for i in range(40)]
+    raw = pd.DataFrame({
+        "create_date": (pd.Timestamp(first) + pd.to_timedelta(rng.integers(0, 7 * 24 * 3600, 300), "s")).astype(str),
+        "campaign_name": rng.choice(["ggl-a-x", "ggl-b-y", "reg1-z", "regtiktok2"], 300),
+        "phone": rng.choice(phones, 300),
+        "selected": rng.choice(["yes", "no"], 300),
+    })
+    free_text = SharedFrame(prepare_free_text(raw.sample(frac=1, random_state=2)), date="create_date")
+    crm = pd.DataFrame({
+        "mt_leads_code": [f"L{i}" for i in range(60)],
+        "owner_phone": ["62" + phone for phone in rng.choice(phones, 60)],
+        "m_status_code": pd.Categorical(rng.choice(["assigned", "junked", None], 60)),
+        "deal": pd.Categorical(rng.choice(["deal", "pipeline", "leads"], 60)),
+        "submit_at": pd.Timestamp(first) + pd.to_timedelta(rng.integers(-3, 7, 60), "D"),
+    })
+    index = PhoneIndex(crm)
+
+    for offset in (0, 1, 3):
+        day = first + datetime.timedelta(days=offset)
+        write_day(day, day_snapshot(free_text.view(start=day, end=day), index, f"2022-10-0{offset + 1}"), str(tmp_path))
+
+    for start, end in [(first, today), (first + datetime.timedelta(days=1), today - datetime.timedelta(days=2))]:
+        rows = free_text.view(start=start, end=end)
+        expected = baseline_merge(rows, crm, start, end)
+        free_text_cube, crm_cube, unique, status_as_of = range_rollups(
+            start, end, lambda first, last: free_text, lambda: index, directory=str(tmp_path))
+
+        assert status_as_of == pd.Timestamp("2022-10-01" if start == first else "2022-10-02")
+        assert free_text_cube.total() == len(rows)
+        assert unique == rows["phone"].nunique()
+        assert crm_cube.total() == len(expected)
+        for deal in ("deal", "pipeline", "leads"):
+            assert crm_cube.total(deal=deal) == int((expected["deal"] == deal).sum())
+        by_adset = crm_cube.group(["adset", "deal"]).astype({"adset": str, "deal": str}).set_index(["adset", "deal"])["count"]
+        expected_by_adset = expected.astype({"adset": str, "deal": str}).groupby(["adset", "deal"]).size()
+        pd.testing.assert_series_equal(by_adset.sort_index(), expected_by_adset.sort_index(), check_names=False, check_dtype=False)
+
+
+def test_only_days_without_snapshot_are_queried(tmp_path):
+    today = datetime.date.today()
+    first = today - datetime.timedelta(days=3)
+    raw = pd.DataFrame({"create_date": [str(first), str(today)], "campaign_name": ["ggl-a-x", "reg1"],
+                        "phone": ["81", "82"], "selected": ["yes", "no"]})
+    free_text = SharedFrame(prepare_free_text(raw), date="create_date")
+    crm = pd.DataFrame({"mt_leads_code": ["L1"], "owner_phone": ["6281"], "m_status_code": pd.Categorical(["assigned"]),
+                        "deal": pd.Categorical(["deal"]), "submit_at": pd.to_datetime([first])})
+    index = PhoneIndex(crm)
+    for offset in range(3):
+        day = first + datetime.timedelta(days=offset)
+        write_day(day, day_snapshot(free_text.view(start=day, end=day), index), str(tmp_path))
+
+    queried = []
+    def query(start, end):
+        queried.append((start, end))
+        return free_text
+
+    free_text_cube, crm_cube, unique, status_as_of = range_rollups(first, today, query, lambda: index, directory=str(tmp_path))
+    assert queried == [(today, today)]
+    assert (free_text_cube.total(), crm_cube.total(), unique, status_as_of) == (2, 1, 2, None)
+
+
+def test_rewritten_day_never_exposes_partial_runs(tmp_path):
+    day = datetime.date(2022, 10, 1)
+    snapshot = lambda phones: {
+        "phones": pd.DataFrame({"phone": phones}),
+        "matches": pd.DataFrame({"mt_leads_code": [], "submit_at": pd.to_datetime([])}),
+        "free_text": pd.DataFrame({"phone": phones}),
+        "crm_updated_at": None,
+    }
+    folder = tmp_path / "2022-10-01"
+
+    write_day(day, snapshot(["1"]), str(tmp_path))
+    first_run = [path for path in folder.iterdir() if path.is_dir()]
+
+    # a run failing halfway leaves the previous run in place
+    broken = snapshot(["2"])
+    del broken["free_text"]
+    with pytest.raises(KeyError):
+        write_day(day, broken, str(tmp_path))
+    assert list(read_days([day], str(tmp_path))["phones"]["phone"]) == ["1"]
+
+    # the run replaced last is kept for readers still on it, older ones are removed
+    write_day(day, snapshot(["3"]), str(tmp_path))
+    assert first_run[0].exists()
+    write_day(day, snapshot(["4"]), str(tmp_path))
+    assert not first_run[0].exists()
+    assert len([path for path in folder.iterdir() if path.is_dir()]) == 2
+    assert closed_days(day, day, str(tmp_path)) == [day]
+    assert list(read_days([day], str(tmp_path))["phones"]["phone"]) == ["4"]
+
+
+def test_days_written_before_run_folders_are_read(tmp_path):
+    day = datetime.date(2022, 10, 1)
+    folder = tmp_path / "2022-10-01"
+    folder.mkdir()
+    for name in ("phones", "matches", "free_text"):
+        pd.DataFrame({"phone": ["1"]}).to_parquet(folder / f"{name}.parquet")
+    assert closed_days(day, day, str(tmp_path)) == [day]
+    assert list(read_days([day], str(tmp_path))["phones"]["phone"]) == ["1"]
+
+    write_day(day, {name: pd.DataFrame({"phone": ["2"]}) for name in ("phones", "matches", "free_text")}, str(tmp_path))
+    assert list(read_days([day], str(tmp_path))["phones"]["phone"]) == ["2"]
+    write_day(day, {name: pd.DataFrame({"phone": ["3"]}) for name in ("phones", "matches", "free_text")}, str(tmp_path))
+    assert not (folder / "free_text.parquet").exists()
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+from utils.dtypes import MAX_CATEGORY_RATIO, compact_frame, compaction_report, plan_dtypes
+
+
+def test_integer_downcasts():
+    frame = pd.DataFrame({
+        "small": np.array([0, 200], dtype="int64"),
+        "signed": np.array([-5, 100], dtype="int64"),
+        "wide": np.array([0, 70_000], dtype="int64"),
+        # nullable integers with missing values keep their missing values
+        "missing": pd.array([1, None], dtype="Int64"),
+        "missing_signed": pd.array([-1, None], dtype="Int64"),
+    })
+    plan = plan_dtypes(frame)
+    assert (plan["small"], plan["signed"], plan["wide"]) == (np.uint8, np.int8, np.uint32)
+    assert (str(plan["missing"]), str(plan["missing_signed"])) == ("UInt8", "Int8")
+
+    compacted = compact_frame(frame.copy())
+    assert compacted["missing"].isna().tolist() == [False, True]
+    assert compacted["missing_signed"].tolist()[0] == -1
+
+
+def test_float_downcast_only_when_lossless():
+    frame = pd.DataFrame({
+        "halves": [0.5, 1.25, np.nan],
+        "precise": [0.1, 1 / 3, np.nan],
+        "large": [1e40, 1.0, 2.0],
+    })
+    plan = plan_dtypes(frame)
+    assert plan == {"halves": np.float32}
+
+    compacted = compact_frame(frame.copy())
+    assert compacted["halves"].isna().tolist() == [False, False, True]
+    assert compacted["precise"].tolist()[:2] == [0.1, 1 / 3]
+
+
+def test_dates_need_the_parse_threshold():
+    dates = [f"2022-10-{day:02d}" for day in range(1, 21)]
+    frame = pd.DataFrame({
+        "create_date": dates,
+        # one value in twenty failing to parse is still a date column (95%)
+        "submit_at": dates[:19] + ["unknown"],
+        # two are not
+        "last_date": dates[:18] + ["unknown", "later"],
+        "note": dates,
+    })
+    plan = plan_dtypes(frame)
+    assert plan["create_date"] == np.dtype("datetime64[ns]")
+    assert plan["submit_at"] == np.dtype("datetime64[ns]")
+    assert plan.get("last_date") != np.dtype("datetime64[ns]")
+    # only columns named like dates are parsed, others stay text
+    assert "note" not in plan
+
+    assert "create_date" not in plan_dtypes(frame, detect_dates=False)
+    assert plan_dtypes(frame, date_columns=["note"])["note"] == np.dtype("datetime64[ns]")
+
+    compacted = compact_frame(frame.copy())
+    assert compacted["submit_at"].isna().tolist() == [False] * 19 + [True]
+
+
+def test_categorical_cutoff():
+    rows = 20
+    distinct = int(MAX_CATEGORY_RATIO * rows)
+    frame = pd.DataFrame({
+        "at_cutoff": [f"v{i % distinct}" for i in range(rows)],
+        "above_cutoff": [f"v{i % (distinct + 1)}" for i in range(rows)],
+        # missing values do not count as rows
+        "sparse": ["a", "b"] + [None] * (rows - 2),
+        "empty": [None] * rows,
+    }, dtype=object)
+    plan = plan_dtypes(frame)
+    assert plan == {"at_cutoff": "category"}
+
+    frame = compact_frame(frame, name="test")
+    assert pd.api.types.is_categorical_dtype(frame["at_cutoff"])
+    before, after = compaction_report()["test"]
+    assert after < before
+
+
+def test_categorical_and_bool_columns_are_kept():
+    frame = pd.DataFrame({"flag": [True, False], "kind": pd.Categorical(["a", "a"]), "count": [1, 2]})
+    assert plan_dtypes(frame) == {"count": np.uint8}
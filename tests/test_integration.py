@@ -0,0 +1,61 @@
+import datetime
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from utils.integration import make_integration_cache, split_windows
+
+
+@pytest.fixture
+def stub_server():
+    # integration endpoint answering one submission per requested day
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            params = {name: values[0] for name, values in parse_qs(urlparse(self.path).query).items()}
+            requests.append((params["startdate"], params["enddate"]))
+            days = split_windows(datetime.date.fromisoformat(params["startdate"]),
+                                 datetime.date.fromisoformat(params["enddate"]))
+            rows = [{"phone": f"62{start:%m%d}", "create_date": f"{start} 08:00:00", "campaign_name": "lp"}
+                    for start, _ in days]
+            body = json.dumps({"data": rows}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/api/report/integration", requests
+    server.shutdown()
+    server.server_close()
+
+
+def test_widened_range_reuses_windows(stub_server):
+    url, requests = stub_server
+    cache = make_integration_cache(url=url)
+    first = datetime.date(2022, 10, 1)
+
+    assert len(cache.get((first, first + datetime.timedelta(days=2)))) == 3
+    assert len(requests) == 3
+
+    # only the two new days are requested
+    frame = cache.get((first, first + datetime.timedelta(days=4)))
+    assert len(frame) == 5
+    assert sorted(requests[3:]) == [("2022-10-04", "2022-10-04"), ("2022-10-05", "2022-10-05")]
+
+    # the same range again is a hit without any request
+    cache.get((first, first + datetime.timedelta(days=4)))
+    assert len(requests) == 5
+    assert cache.stats()["hits"] == 1
@@ -0,0 +1,48 @@
+from utils.outlet import column_options, outlet_batches, outlet_columns, read_outlet
+from utils.snapshot import stream_snapshot
+
+
+CSV = """,outlet_id,owner_phone,city,gmv,outlets,rating,note,empty
+0,12345678901234567,08123,Jakarta,1500.5,3,4,ok,
+1,12345678901234568,628777,Bandung,200,12,N/A,,
+2,12345678901234569,0812x,Jakarta,,7,5,x,
+"""
+
+
+def snapshot(tmp_path, csv=CSV, chunksize=2):
+    source = tmp_path / "outlet.csv"
+    source.write_text(csv)
+    return stream_snapshot(f"file://{source}", lambda file: outlet_batches(file, chunksize=chunksize),
+                           cache_dir=str(tmp_path / "snapshots"))
+
+
+def test_only_columns_numeric_in_the_whole_file_become_numbers(tmp_path):
+    path = snapshot(tmp_path)
+    assert outlet_columns(path) == {
+        "outlet_id": "text", "owner_phone": "text", "city": "text", "gmv": "number",
+        "outlets": "number", "rating": "text", "note": "text", "empty": "text",
+    }
+
+    frame = read_outlet(path)
+    assert frame["outlet_id"].astype(str).tolist() == ["12345678901234567", "12345678901234568", "12345678901234569"]
+    assert frame["owner_phone"].astype(str).tolist() == ["08123", "628777", "0812x"]
+    # a value failing to parse in a later chunk keeps the column as text
+    assert frame["rating"].astype(str).tolist() == ["4", "N/A", "5"]
+    assert frame["outlets"].tolist() == [3, 12, 7]
+    assert frame["gmv"].tolist()[:2] == [1500.5, 200.0]
+
+
+def test_filters_apply_while_streaming(tmp_path):
+    path = snapshot(tmp_path, chunksize=1)
+    frame = read_outlet(path, ["owner_phone", "gmv"], (("city", "in", ("Jakarta",)), ("note", "contains", "X")))
+    assert list(frame.columns) == ["owner_phone", "gmv"]
+    assert frame["owner_phone"].astype(str).tolist() == ["0812x"]
+    assert column_options(path, "city") == ["Bandung", "Jakarta"]
+
+
+def test_between_on_integer_column(tmp_path):
+    csv = CSV + "3,12345678901234570,0813,Bogor,10,,1,y,\n"
+    path = snapshot(tmp_path, csv=csv)
+    frame = read_outlet(path, ["city", "outlets"], (("outlets", "between", (5.0, 12.0)),))
+    assert frame["city"].astype(str).tolist() == ["Bandung", "Jakarta"]
+    assert frame["outlets"].tolist() == [12, 7]
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.phone import normalize_phone
+
+
+def reference_phone(phone):
+    # the row-wise lambda normalize_phone replaced
+    return ("62" + phone[:] if phone.startswith("8")
+            else phone.replace("0", "62", 1) if phone.startswith("0")
+            else phone.replace(phone[0:3], "62", 1) if phone.startswith("620")
+            else phone)
+
+
+def raw_phones(rows=2_000, seed=0):
+    rng = np.random.default_rng(seed)
+    numbers = [f"{rng.integers(10**8, 10**10)}" for _ in range(200)]
+    # the same number written with each prefix collapses into one normalized phone
+    prefixed = [prefix + number for number in numbers for prefix in ("8", "08", "628", "6208", "+628")]
+    return pd.Series(rng.choice(prefixed + ["", "0", "620", "6200812", "62"], rows), dtype=object)
+
+
+@pytest.mark.parametrize("dtype", ["object", "category"])
+def test_matches_row_wise_reference(dtype):
+    phones = raw_phones()
+    expected = phones.map(reference_phone)
+    result = normalize_phone(phones.astype(dtype))
+    pd.testing.assert_series_equal(result.astype(object), expected)
+
+
+def test_categorical_codes_are_remapped():
+    phones = pd.Series(["0812", "812", "62812", None, "620812", "0813"], dtype="category", index=list("abcdef"))
+    result = normalize_phone(phones)
+
+    assert pd.api.types.is_categorical_dtype(result)
+    assert list(result.index) == list("abcdef")
+    # four raw categories collapse into one, the missing value stays missing
+    assert result.astype(object).where(result.notna(), None).tolist() == ["62812", "62812", "62812", None, "62812", "62813"]
+    assert sorted(result.cat.categories) == ["62812", "62813"]
+
+
+def test_missing_values_stay_missing():
+    result = normalize_phone(pd.Series(["0812", None, np.nan], dtype=object))
+    assert result.iloc[0] == "62812"
+    assert result.iloc[1:].isna().all()
@@ -0,0 +1,58 @@
+import pandas as pd
+
+from utils.rollup import attribution_rollup, free_text_rollup
+
+
+def test_categorical_nan_keys_keep_row_total():
+    frame = pd.DataFrame({
+        "create_date": pd.to_datetime(["2022-10-01", "2022-10-01", "2022-10-02", "2022-10-02"]),
+        "campaign_source": pd.Categorical(["google", "facebook", "google", "google"]),
+        "adset": pd.Categorical(["a", None, "b", "a"]),
+        "selected": pd.Categorical(["yes", "no", None, "yes"]),
+        "m_status_code": pd.Categorical(["assigned", None, None, "junked"]),
+        "deal": pd.Categorical(["deal", "pipeline", "deal", None]),
+        "mt_leads_code": ["L1", "L2", "L3", None],
+        "phone": ["621", "622", None, "624"],
+    })
+
+    free_text = free_text_rollup(frame)
+    assert free_text.total() == 4
+    assert free_text.total(measure="count") == 3
+
+    attribution = attribution_rollup(frame)
+    assert attribution.total() == 4
+    assert attribution.total(deal="deal") == 2
+    assert attribution.total(deal="pipeline") == 1
+
+
+def test_group_matches_raw_groupby_count():
+    frame = pd.DataFrame({
+        "create_date": pd.to_datetime(["2022-10-01"] * 5),
+        "campaign_source": pd.Categorical(["google"] * 5),
+        "adset": pd.Categorical(["a", "a", "b", None, "b"]),
+        "selected": pd.Categorical(["yes", None, "no", "yes", "no"]),
+        "phone": ["1", "2", None, "4", "5"],
+    })
+    cube = free_text_rollup(frame)
+
+    expected = frame.groupby(["adset", "selected"], observed=True)["phone"].count().reset_index(name="count")
+    expected = expected.loc[expected["count"] > 0].astype({"adset": object, "selected": object})
+    result = cube.group(["adset", "selected"]).astype({"adset": object, "selected": object})
+    pd.testing.assert_frame_equal(
+        result.sort_values(["adset", "selected"]).reset_index(drop=True),
+        expected.sort_values(["adset", "selected"]).reset_index(drop=True),
+        check_dtype=False,
+    )
+
+
+def test_update_folds_new_days():
+    day = lambda date, adset: pd.DataFrame({
+        "create_date": pd.to_datetime([date]),
+        "campaign_source": pd.Categorical(["google"]),
+        "adset": pd.Categorical([adset]),
+        "selected": pd.Categorical([None]),
+        "phone": ["1"],
+    })
+    cube = free_text_rollup(day("2022-10-01", "a")).update(free_text_rollup(day("2022-10-02", None)))
+    assert cube.total() == 2
+    assert cube.slice("2022-10-02", "2022-10-02").total() == 1
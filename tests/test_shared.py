@@ -0,0 +1,43 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.shared import SharedFrame
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    dates = pd.Timestamp("2022-10-01") + pd.to_timedelta(rng.integers(0, 30, 500), "D")
+    frame = pd.DataFrame({"create_date": dates, "row": np.arange(500)})
+    frame.loc[::50, "create_date"] = pd.NaT
+    return frame
+
+
+def test_date_ranges_are_sliced_newest_first(frame):
+    shared = SharedFrame(frame.copy(), date="create_date")
+    for start, end in [(datetime.date(2022, 10, 3), datetime.date(2022, 10, 20)),
+                       (datetime.date(2022, 9, 1), datetime.date(2022, 9, 5)),
+                       (datetime.date(2022, 10, 25), datetime.date(2022, 12, 1)),
+                       (datetime.date(2022, 10, 10), datetime.date(2022, 10, 1))]:
+        view = shared.view(start=start, end=end)
+        days = frame["create_date"].dt.date
+        expected = frame.loc[(days >= start) & (days <= end)]
+        assert sorted(view["row"]) == sorted(expected["row"])
+        assert view["create_date"].is_monotonic_decreasing
+
+
+def test_rows_of_a_day_keep_their_order(frame):
+    view = SharedFrame(frame.copy(), date="create_date").view(start=datetime.date(2022, 10, 7), end=datetime.date(2022, 10, 7))
+    assert view["row"].is_monotonic_increasing
+
+
+def test_views_share_read_only_buffers(frame):
+    shared = SharedFrame(frame.copy(), date="create_date")
+    view = shared.view(start=datetime.date(2022, 10, 1), end=datetime.date(2022, 10, 30))
+    with pytest.raises(ValueError):
+        view["row"].to_numpy()[0] = -1
+    view["extra"] = 1
+    assert "extra" not in shared.columns
@@ -0,0 +1,90 @@
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from utils.shared_cache import DiskBackend, FakeRedis, RedisBackend, SharedCache
+
+
+@pytest.fixture(params=["disk", "redis"])
+def backend(request, tmp_path):
+    if request.param == "disk":
+        return DiskBackend(str(tmp_path))
+    return RedisBackend(FakeRedis())
+
+
+def slow_loader(calls, delay=0.2):
+    def load(key):
+        calls.append(key)
+        time.sleep(delay)
+        return pd.DataFrame({"key": [key], "call": [len(calls)]})
+
+    return load
+
+
+def test_concurrent_misses_rebuild_once(backend):
+    # one cache per thread stands in for the processes sharing the backend
+    calls, results = [], []
+    caches = [SharedCache(slow_loader(calls), ttl=60, backend=backend) for _ in range(6)]
+    threads = [threading.Thread(target=lambda cache=cache: results.append(cache.get("a"))) for cache in caches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == ["a"]
+    assert [frame["call"].iloc[0] for frame in results] == [1] * 6
+
+
+def test_stale_entry_served_while_rebuilding(backend):
+    calls = []
+    cache = SharedCache(slow_loader(calls, delay=0.3), ttl=0.1, stale_ttl=60, backend=backend)
+    cache.get("a")
+    time.sleep(0.15)
+
+    # the first caller refreshes, the second one gets the stale entry at once
+    refresh = threading.Thread(target=cache.get, args=("a",))
+    refresh.start()
+    time.sleep(0.05)
+    started = time.monotonic()
+    assert cache.get("a")["call"].iloc[0] == 1
+    assert time.monotonic() - started < 0.2
+    refresh.join()
+    assert cache.get("a")["call"].iloc[0] == 2
+
+
+def test_sweep_deletes_expired_entries(tmp_path):
+    backend = DiskBackend(str(tmp_path), sweep_interval=60 * 60)
+    cache = SharedCache(lambda key: pd.DataFrame({"key": [key]}), ttl=1, stale_ttl=1, backend=backend)
+    cache.get("old")
+    long_lived = SharedCache(lambda key: pd.DataFrame({"key": [key]}), ttl=60, backend=backend, namespace="other")
+    long_lived.get("kept")
+    open(os.path.join(tmp_path, "orphan.lock"), "a").close()
+    assert len(os.listdir(tmp_path)) == 5
+
+    assert backend.sweep(now=time.time() + 10) == 1
+    assert sorted(os.path.splitext(name)[1] for name in os.listdir(tmp_path)) == [".arrow", ".lock"]
+    assert long_lived.get("kept")["key"].iloc[0] == "kept"
+
+
+def test_sweep_skips_entries_being_rebuilt(tmp_path):
+    backend = DiskBackend(str(tmp_path))
+    backend.write("entry", pd.DataFrame({"key": [1]}), max_age=60)
+    later = time.time() + 120
+    handle = backend.acquire("entry", timeout=0)
+    try:
+        assert backend.sweep(now=later) == 0
+    finally:
+        backend.release(handle)
+    assert backend.sweep(now=later) == 1
+    assert os.listdir(tmp_path) == []
+
+
+def test_redis_entries_expire():
+    backend = RedisBackend(FakeRedis())
+    backend.write("entry", pd.DataFrame({"key": [1]}), max_age=0.05)
+    assert backend.read("entry") is not None
+    time.sleep(0.1)
+    assert backend.read("entry") is None
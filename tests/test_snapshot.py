@@ -0,0 +1,103 @@
+import pandas as pd
+
+from utils.crm import read_crm_csv
+from utils.snapshot import load_snapshot
+
+
+CRM_HEADER = ("mt_preleads_code,mt_leads_code,owner_phone,rating,status,m_status_code,counter_meeting,counter_followup,"
+              "note,submit_at,assign_at,approved_paid_at,created_payment,last_update\n")
+
+
+def crm_row(code, phone, status_code, last_update, rating=3, note=None):
+    note = note or f"called {code}"
+    return (f"P{code},L{code},{phone},{rating},3,{status_code},1,1,{note},"
+            f"2022-10-01 08:00:00,2022-10-01,,,{last_update}\n")
+
+
+def write_source(path, rows):
+    path.write_text(CRM_HEADER + "".join(rows))
+    return f"file://{path}"
+
+
+def load_crm_snapshot(url, cache_dir):
+    return load_snapshot(url, read_crm_csv, cache_dir=cache_dir, key="mt_preleads_code", watermark="last_update")
+
+
+def test_incremental_reload_matches_full_build(tmp_path):
+    source = tmp_path / "leads_crm.csv"
+    cache_dir = str(tmp_path / "snapshots")
+    rows = [crm_row(i, f"0812{i:04d}", "NEW", f"2022-10-0{1 + i % 3} 10:00:00") for i in range(8)]
+    url = write_source(source, rows)
+    first = load_crm_snapshot(url, cache_dir)
+    assert len(first) == 8
+
+    # lead 1 is paid, lead 3 changed within the stored watermark's second, lead 8 is new
+    # notes are distinct over the history but repeat within the changed rows
+    rows[1] = crm_row(1, "08120001", "PAID", "2022-10-05 09:00:00", note="follow up")
+    rows[3] = crm_row(3, "08120003", "WAITING PAYMENT", "2022-10-03 10:00:00", note="follow up")
+    rows.append(crm_row(8, "8120008", "INVOICE SENT", "2022-10-05 09:00:00", rating=5, note="follow up"))
+    for i in (2, 5):
+        rows[i] = crm_row(i, f"0812{i:04d}", "NEW", "2022-10-03 10:00:00", note="follow up")
+    url = write_source(source, rows)
+
+    calls = []
+    def build(file, since=None):
+        calls.append(since)
+        return read_crm_csv(file, since=since)
+
+    reloaded = load_snapshot(url, build, cache_dir=cache_dir, key="mt_preleads_code", watermark="last_update")
+    assert calls == [pd.Timestamp("2022-10-03 10:00:00")]
+
+    with open(source, "rb") as file:
+        expected = read_crm_csv(file)
+    result = reloaded.sort_values("mt_preleads_code").reset_index(drop=True)
+    expected = expected.sort_values("mt_preleads_code").reset_index(drop=True)
+    pd.testing.assert_frame_equal(result.astype(str), expected.astype(str))
+
+    # the stored schema is kept although the delta compacts differently
+    assert pd.api.types.is_object_dtype(reloaded["note"])
+    assert pd.api.types.is_categorical_dtype(reloaded["deal"])
+    assert pd.api.types.is_categorical_dtype(reloaded["owner_phone"])
+    deal = dict(zip(reloaded["mt_preleads_code"].astype(str), reloaded["deal"].astype(str)))
+    assert (deal["P1"], deal["P3"], deal["P8"], deal["P0"]) == ("deal", "deal", "pipeline", "leads")
+    assert dict(zip(reloaded["mt_preleads_code"].astype(str), reloaded["owner_phone"].astype(str)))["P8"] == "628120008"
+
+
+def test_unchanged_source_reloads_from_snapshot(tmp_path):
+    url = write_source(tmp_path / "leads_crm.csv", [crm_row(1, "08120001", "NEW", "2022-10-01 10:00:00")])
+    cache_dir = str(tmp_path / "snapshots")
+    load_crm_snapshot(url, cache_dir)
+
+    calls = []
+    def build(file, since=None):
+        calls.append(since)
+        return read_crm_csv(file, since=since)
+
+    frame = load_snapshot(url, build, columns=["mt_preleads_code", "deal"], cache_dir=cache_dir,
+                          key="mt_preleads_code", watermark="last_update")
+    assert calls == []
+    assert list(frame.columns) == ["mt_preleads_code", "deal"]
+
+
+def test_snapshot_follows_source_version(tmp_path):
+    source = tmp_path / "outlet.csv"
+    cache_dir = tmp_path / "snapshots"
+    calls = []
+    def build(file):
+        calls.append(1)
+        return pd.read_csv(file)
+
+    source.write_text("code,value\na,1\n")
+    url = f"file://{source}"
+    assert load_snapshot(url, build, cache_dir=str(cache_dir))["value"].tolist() == [1]
+    # the same version is read back from the local snapshot
+    assert load_snapshot(url, build, cache_dir=str(cache_dir), columns=["code"]).columns.tolist() == ["code"]
+    assert len(calls) == 1
+    first = list(cache_dir.iterdir())
+
+    source.write_text("code,value\na,1\nb,22\n")
+    assert load_snapshot(url, build, cache_dir=str(cache_dir))["value"].tolist() == [1, 22]
+    assert len(calls) == 2
+    # only the snapshot of the current version is kept
+    snapshots = list(cache_dir.iterdir())
+    assert len(snapshots) == 1 and snapshots != first
@@ -0,0 +1,98 @@
+import os
+import time
+
+import pandas as pd
+
+from utils.write_queue import WriteQueue
+from utils.writer import MemorySink
+
+
+TARGET = "project.dataset.leads"
+
+
+def leads(*phones):
+    return pd.DataFrame({
+        "phone": list(phones),
+        "create_date": ["2022-10-01"] * len(phones),
+        "campaign_name": ["ggl-brand"] * len(phones),
+        "selected": ["yes"] * len(phones),
+    })
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_submissions_are_coalesced_and_committed(tmp_path):
+    sink = MemorySink()
+    queue = WriteQueue(lambda: sink, spool_dir=str(tmp_path), linger=0.1)
+    queue.submit(leads("621", "622"), target=TARGET)
+    queue.submit(leads("622", "623"), target=TARGET)
+
+    wait_until(lambda: queue.status()["committed"] == 4)
+    status = queue.status()
+    assert (status["queued"], status["in_flight"], status["inserted"], status["failures"]) == (0, 0, 3, 0)
+    assert sorted(sink.tables[TARGET]["phone"]) == ["621", "622", "623"]
+    assert not any(name.endswith(".parquet") for _, _, files in os.walk(tmp_path) for name in files)
+
+
+def test_batch_committed_elsewhere_is_not_retried(tmp_path):
+    queue = WriteQueue(MemorySink, spool_dir=str(tmp_path), linger=0.3)
+    queue.submit(leads("621", "622", "623"), target=TARGET)
+
+    # another replica sharing the spool commits and removes the file first
+    for directory, _, files in os.walk(tmp_path):
+        for name in files:
+            os.remove(os.path.join(directory, name))
+
+    wait_until(lambda: queue.status()["committed"] == 3)
+    status = queue.status()
+    assert (status["queued"], status["failures"], status["inserted"], status["last_error"]) == (0, 0, 0, None)
+
+
+def test_spooled_submissions_are_written_after_restart(tmp_path):
+    class FailingSink(MemorySink):
+        def stage(self, target, frame):
+            raise ConnectionError("offline")
+
+    offline = WriteQueue(FailingSink, spool_dir=str(tmp_path), linger=0.05)
+    offline.submit(leads("621"), target=TARGET)
+    wait_until(lambda: offline.status()["failures"] >= 1)
+
+    sink = MemorySink()
+    restarted = WriteQueue(lambda: sink, spool_dir=str(tmp_path), linger=0.05)
+    wait_until(lambda: restarted.status()["committed"] == 1)
+    assert list(sink.tables[TARGET]["phone"]) == ["621"]
+
+
+def test_failing_submission_is_set_aside(tmp_path, monkeypatch):
+    monkeypatch.setattr("utils.write_queue.RETRY_BACKOFF", 0.01)
+
+    class StrictSink(MemorySink):
+        # rejects frames with a column the table lacks, like the MERGE would
+        def stage(self, target, frame):
+            if "unknown" in frame.columns:
+                raise ValueError("no such field: unknown")
+            return super().stage(target, frame)
+
+    tables = {}
+    queue = WriteQueue(lambda: StrictSink(tables), spool_dir=str(tmp_path), linger=0.05, max_attempts=3)
+    queue.submit(leads("620").assign(unknown=1), target=TARGET)
+    queue.submit(leads("621"), target=TARGET)
+
+    wait_until(lambda: queue.status()["committed"] == 1)
+    wait_until(lambda: queue.status()["dead_letter"] == 1)
+    queue.submit(leads("622"), target=TARGET)
+    wait_until(lambda: queue.status()["committed"] == 2)
+
+    status = queue.status()
+    assert (status["queued"], status["in_flight"], status["failures"]) == (0, 0, 3)
+    assert sorted(tables[TARGET]["phone"]) == ["621", "622"]
+    assert len(os.listdir(os.path.join(status["dead_letter_dir"], TARGET))) == 1
+
+    # set aside files are not picked up again on restart
+    restarted = WriteQueue(lambda: StrictSink(tables), spool_dir=str(tmp_path), linger=0.05)
+    assert (restarted.status()["queued"], restarted.status()["dead_letter"]) == (0, 1)
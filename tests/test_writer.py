@@ -0,0 +1,86 @@
+import datetime
+
+import pandas as pd
+import pytest
+
+from utils.writer import BigQuerySink, MemorySink, lead_ids, write_leads
+
+
+TARGET = "project.dataset.leads"
+
+
+def leads(phones, create_date="2022-10-01 08:00:00", campaign_name="ggl-brand"):
+    return pd.DataFrame({
+        "phone": phones,
+        "create_date": [create_date] * len(phones),
+        "campaign_name": [campaign_name] * len(phones),
+        "selected": ["yes"] * len(phones),
+    })
+
+
+def test_rerun_inserts_nothing():
+    sink = MemorySink()
+    frame = leads(["621", "622", "623"])
+
+    assert write_leads(sink, frame, target=TARGET) == 3
+    assert write_leads(sink, frame, target=TARGET) == 0
+    assert len(sink.tables[TARGET]) == 3
+    # staging tables are dropped after every merge
+    assert list(sink.tables) == [TARGET]
+
+
+def test_only_new_keys_are_inserted():
+    sink = MemorySink({TARGET: leads(["621"])})
+
+    frame = pd.concat([leads(["621", "622", "622"]), leads(["621"], campaign_name="fb-brand")], ignore_index=True)
+    assert write_leads(sink, frame, target=TARGET) == 2
+    stored = sink.tables[TARGET]
+    assert sorted(zip(stored["phone"], stored["campaign_name"])) == [
+        ("621", "fb-brand"), ("621", "ggl-brand"), ("622", "ggl-brand")]
+
+
+def test_missing_key_values_compare_equal():
+    sink = MemorySink()
+    frame = leads([None, "622"])
+    assert write_leads(sink, frame, target=TARGET) == 2
+    assert write_leads(sink, leads([None]), target=TARGET) == 0
+
+
+def test_lead_ids_match_merge_keys():
+    frame = pd.concat([leads(["621", None]), leads(["621", None])], ignore_index=True)
+    ids = lead_ids(frame)
+    assert ids[0] == ids[2] and ids[1] == ids[3]
+    assert ids[0] != ids[1]
+
+
+def test_sinks_share_the_tables_they_are_given():
+    # write queue workers create a sink per batch over the same tables
+    tables = {}
+    write_leads(MemorySink(tables), leads(["621"]), target=TARGET)
+    assert write_leads(MemorySink(tables), leads(["621", "622"]), target=TARGET) == 1
+    assert len(tables[TARGET]) == 2
+
+
+def test_staging_table_expires_before_loading():
+    bigquery = pytest.importorskip("google.cloud.bigquery")
+    calls = []
+
+    class Job:
+        def result(self):
+            return None
+
+    class Client:
+        def get_table(self, target):
+            return bigquery.Table(target, schema=[bigquery.SchemaField(column, "STRING") for column in leads([]).columns])
+
+        def create_table(self, table):
+            calls.append(("create", table.expires))
+
+        def load_table_from_dataframe(self, frame, destination, job_config=None):
+            calls.append(("load", job_config.write_disposition))
+            return Job()
+
+    BigQuerySink(Client()).stage(TARGET, leads(["621"]))
+    (create, expires), load = calls
+    assert create == "create" and expires > datetime.datetime.now(datetime.timezone.utc)
+    assert load == ("load", "WRITE_APPEND")
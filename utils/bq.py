@@ -0,0 +1,147 @@
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+
+
+# free text table written by the classification page
+FREE_TEXT_TABLE = "teak-advice-354202.free_text_v3.all_status"
+
+# columns of the free text table used by the dashboard
+DASHBOARD_COLUMNS = ["create_date", "campaign_name", "phone", "selected"]
+
+# columns converted to datetime64 when reading query results
+DATE_COLUMNS = ["create_date"]
+
+# table -> type of its create_date column, looked up once per process
+_date_types = {}
+_date_types_lock = threading.Lock()
+
+
+def date_column_type(client, table=FREE_TEXT_TABLE, column="create_date"):
+    # BigQuery type of the date column of table, e.g. TIMESTAMP or STRING
+    with _date_types_lock:
+        if (table, column) not in _date_types:
+            field = next(field for field in client.get_table(table).schema if field.name == column)
+            _date_types[(table, column)] = field.field_type
+        return _date_types[(table, column)]
+
+
+def build_free_text_query(start_date, end_date, columns=None, table=FREE_TEXT_TABLE, date_type="STRING"):
+    # select the dashboard columns of rows created within [start_date, end_date].
+    # create_date is compared as is with parameters of its own type (date_type),
+    # so partition and cluster pruning on it keep the bytes scanned proportional
+    # to the range. STRING dates compare as text, which orders ISO dates correctly
+    from google.cloud import bigquery
+
+    columns = ", ".join(f"`{column}`" for column in (columns or DASHBOARD_COLUMNS))
+    sql = (
+        f"SELECT {columns} FROM `{table}` "
+        "WHERE create_date >= @start_date AND create_date < @end_date"
+    )
+    start, end = start_date, end_date + datetime.timedelta(days=1)
+    if date_type == "TIMESTAMP":
+        values = [datetime.datetime.combine(day, datetime.time(), datetime.timezone.utc) for day in (start, end)]
+    elif date_type == "DATETIME":
+        values = [datetime.datetime.combine(day, datetime.time()) for day in (start, end)]
+    elif date_type == "DATE":
+        values = [start, end]
+    else:
+        date_type, values = "STRING", [day.strftime("%Y-%m-%d") for day in (start, end)]
+    parameters = [
+        bigquery.ScalarQueryParameter("start_date", date_type, values[0]),
+        bigquery.ScalarQueryParameter("end_date", date_type, values[1]),
+    ]
+    return sql, parameters
+
+
+class StorageReadBackend:
+    # reads tables as arrow record batches through the BigQuery Storage Read API
+
+    def __init__(self, credentials=None, client=None):
+        from google.cloud import bigquery_storage
+
+        self._types = bigquery_storage.types
+        self.client = client or bigquery_storage.BigQueryReadClient(credentials=credentials)
+
+    def streams(self, table, parent_project, max_streams):
+        read_session = self._types.ReadSession(
+            table=f"projects/{table.project}/datasets/{table.dataset_id}/tables/{table.table_id}",
+            data_format=self._types.DataFormat.ARROW,
+        )
+        session = self.client.create_read_session(
+            parent=f"projects/{parent_project}", read_session=read_session, max_stream_count=max_streams
+        )
+        return [(session, stream.name) for stream in session.streams]
+
+    def read(self, stream):
+        session, name = stream
+        for page in self.client.read_rows(name).rows(session).pages:
+            yield page.to_arrow()
+
+
+class InMemoryReadBackend:
+    # in-process stand-in for StorageReadBackend serving an arrow table split into streams
+
+    def __init__(self, table, batch_size=1024):
+        self.table = table
+        self.batch_size = batch_size
+
+    def streams(self, table, parent_project, max_streams):
+        size = -(-self.table.num_rows // max_streams) if self.table.num_rows else 0
+        return [self.table.slice(offset, size) for offset in range(0, self.table.num_rows, size or 1)]
+
+    def read(self, stream):
+        yield from stream.to_batches(max_chunksize=self.batch_size)
+
+
+def read_table(backend, table, parent_project, max_streams=4):
+    # read every stream of the table concurrently and assemble the batches in stream order
+    streams = backend.streams(table, parent_project, max_streams)
+    if not streams:
+        return None
+
+    with ThreadPoolExecutor(max_workers=len(streams)) as pool:
+        per_stream = list(pool.map(lambda stream: list(backend.read(stream)), streams))
+
+    return pa.Table.from_batches([batch for batches in per_stream for batch in batches])
+
+
+def arrow_to_frame(table, date_columns=None):
+    # strings become categoricals and date columns datetime64 without an object detour
+    for name in date_columns or DATE_COLUMNS:
+        if name not in table.column_names or pa.types.is_timestamp(table.schema.field(name).type):
+            continue
+        try:
+            column = table.column(name).cast(pa.timestamp("us"))
+        except pa.ArrowInvalid:
+            continue
+        table = table.set_column(table.column_names.index(name), name, column)
+
+    return table.to_pandas(strings_to_categorical=True)
+
+
+def query_free_text(client, start_date, end_date, columns=None, credentials=None, backend=None, max_streams=4):
+    # run the date-bounded free text query and download it with the Storage Read API,
+    # falling back to the REST tabledata path when the storage API is unavailable
+    from google.api_core import exceptions
+    from google.cloud import bigquery
+
+    sql, parameters = build_free_text_query(start_date, end_date, columns=columns,
+                                            date_type=date_column_type(client))
+    job_config = bigquery.QueryJobConfig(query_parameters=parameters)
+    job = client.query(sql, job_config=job_config)
+    rows = job.result()
+
+    table = None
+    try:
+        backend = backend or StorageReadBackend(credentials=credentials)
+        table = read_table(backend, job.destination, client.project, max_streams=max_streams)
+    except (ImportError, exceptions.GoogleAPIError):
+        pass
+
+    if table is None:
+        table = rows.to_arrow(create_bqstorage_client=False)
+
+    return arrow_to_frame(table)
@@ -0,0 +1,33 @@
+import pandas as pd
+
+
+# CRM bulk upload template published as csv
+BULK_TEMPLATE_URL = 'https://docs.google.com/spreadsheets/d/e/2PACX-1vRsEd3xRwST913ShSJWvQHfJukE9w3uxKUXKgEZS1p0Jfpdev7UOw2nH52phIUAi4eJNSeCDHf0PbHM/pub?output=csv'
+
+# template column -> column of the selected leads
+BULK_COLUMN_MAP = {
+    'Outlet Name': 'business_name',
+    'Nama PIC': 'name',
+    'Email Address': 'email',
+    'Phone Number': 'phone',
+    'Notes': 'reason_need_majoo',
+    'Sub Entry Source': 'campaign_name',
+}
+
+# template column -> fixed value
+BULK_CONSTANTS = {
+    'Entry Source': 'MARKETING-CAMPAIGN',
+}
+
+
+def read_template_columns(url=BULK_TEMPLATE_URL):
+    # header of the bulk upload template, no rows are parsed
+    return pd.read_csv(url, nrows=0).columns.tolist()
+
+
+def build_bulk_upload(template_columns, selected):
+    # bulk upload rows of the selected leads in template column order
+    columns = list(dict.fromkeys([*template_columns, *BULK_COLUMN_MAP, *BULK_CONSTANTS]))
+    data = {column: selected[source].to_numpy() for column, source in BULK_COLUMN_MAP.items()}
+    data.update({column: value for column, value in BULK_CONSTANTS.items()})
+    return pd.DataFrame(data, index=pd.RangeIndex(len(selected)), columns=columns)
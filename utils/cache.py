@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class RequestCache:
+    # in-process cache for slow loaders with a ttl, a memory bound and
+    # stale-while-revalidate: an expired entry younger than ttl + stale_ttl is
+    # returned immediately while a background thread reloads it
+
+    def __init__(self, loader, ttl, stale_ttl=0, max_bytes=None, sizeof=None):
+        self._loader = loader
+        self._ttl = ttl
+        self._stale_ttl = stale_ttl
+        self._max_bytes = max_bytes
+        self._sizeof = sizeof or (lambda value: 0)
+        self._entries = OrderedDict()  # key -> (value, loaded_at, size, ttl)
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._refreshing = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _store(self, key, value, ttl=None):
+        size = self._sizeof(value)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, time.monotonic(), size, self._ttl if ttl is None else ttl)
+            # evict least recently used entries until the bound holds, never the new one
+            while self._max_bytes is not None and len(self._entries) > 1 and self.nbytes > self._max_bytes:
+                evicted, _ = self._entries.popitem(last=False)
+                self._key_locks.pop(evicted, None)
+
+    def _load(self, key):
+        # one loader call per key at a time, concurrent callers wait for it
+        with self._key_lock(key):
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] < entry[3]:
+                return entry[0]
+            value = self._loader(key)
+            self._store(key, value)
+            return value
+
+    def _revalidate(self, key):
+        try:
+            with self._key_lock(key):
+                self._store(key, self._loader(key))
+        except Exception:
+            with self._lock:
+                self.errors += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                age = time.monotonic() - entry[1]
+                if age < entry[3]:
+                    self.hits += 1
+                    return entry[0]
+                if age < entry[3] + self._stale_ttl:
+                    self.stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        threading.Thread(target=self._revalidate, args=(key,), daemon=True).start()
+                    return entry[0]
+            self.misses += 1
+
+        return self._load(key)
+
+    def lookup(self, key):
+        # fresh cached value or None, never calls the loader
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] < entry[3]:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def keys(self):
+        # keys of the fresh entries, most recently used last
+        with self._lock:
+            now = time.monotonic()
+            return [key for key, entry in self._entries.items() if now - entry[1] < entry[3]]
+
+    def put(self, key, value, ttl=None):
+        # store a value loaded elsewhere, optionally with its own ttl
+        self._store(key, value, ttl=ttl)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def nbytes(self):
+        return sum(entry[2] for entry in self._entries.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "errors": self.errors,
+                "entries": len(self._entries),
+                "bytes": self.nbytes,
+            }
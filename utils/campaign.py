@@ -0,0 +1,54 @@
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+
+# campaign names starting with prefix belong to source, their adset is the
+# adset_part-th "-" separated part. rules are tried in order, first match wins
+CampaignRule = namedtuple("CampaignRule", ["prefix", "source", "adset_part"])
+
+CAMPAIGN_RULES = (
+    CampaignRule("ggl", "google", 1),
+    CampaignRule("regtiktok", "tiktok", 0),
+    CampaignRule("reg", "facebook", 0),
+)
+
+# source and adset part of names matching no rule
+UNDEFINED_RULE = CampaignRule("", "undefined", 0)
+
+# parsed fields of the campaign dimension
+CAMPAIGN_FIELDS = ["campaign_source", "adset"]
+
+
+@lru_cache(maxsize=4096)
+def parse_campaign(name, rules=CAMPAIGN_RULES):
+    # campaign_source and adset of a single campaign name
+    if name is None:
+        return UNDEFINED_RULE.source, None
+    rule = next((rule for rule in rules if name.startswith(rule.prefix)), UNDEFINED_RULE)
+    parts = name.split("-")
+    return rule.source, parts[rule.adset_part] if rule.adset_part < len(parts) else None
+
+
+def campaign_dimension(names, rules=CAMPAIGN_RULES):
+    # one row of parsed fields per distinct campaign name
+    rows = [parse_campaign(None if pd.isna(name) else str(name), rules) for name in names]
+    return pd.DataFrame(rows, index=pd.Index(names, name="campaign_name"), columns=CAMPAIGN_FIELDS)
+
+
+def attach_campaign_dimension(dataframe, column="campaign_name", rules=CAMPAIGN_RULES):
+    # add the parsed campaign fields to dataframe by joining the dimension on the
+    # categorical code of column, so each distinct name is parsed once
+    names = dataframe[column]
+    if not pd.api.types.is_categorical_dtype(names):
+        names = names.astype("category")
+
+    # the missing name goes last so code -1 picks it
+    dimension = campaign_dimension([*names.cat.categories, None], rules)
+    codes = names.cat.codes.to_numpy()
+    for field in CAMPAIGN_FIELDS:
+        field_codes, field_categories = pd.factorize(dimension[field])
+        dataframe[field] = pd.Categorical.from_codes(np.asarray(field_codes)[codes], categories=field_categories)
+    return dataframe
@@ -0,0 +1,194 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.dtypes import compact_frame
+from utils.phone import normalize_phone
+from utils.snapshot import load_snapshot
+
+
+# point CRM_SOURCE_URL at a local csv (e.g. file:///data/leads_crm.csv) to run without GCS
+CRM_URL = os.environ.get("CRM_SOURCE_URL", "gs://lead-analytics-bucket/crm_db/leads_crm.csv")
+# optional export holding only recently updated leads, when unset the full csv is filtered instead
+CRM_DELTA_URL = os.environ.get("CRM_DELTA_URL")
+
+# columns of the crm frame used by the dashboard and the daily snapshot job
+CRM_COLUMNS = ["mt_preleads_code", "mt_leads_code", "owner_phone", "m_status_code", "deal", "submit_at", "last_update"]
+
+# parsed date columns of the crm export
+CRM_DATES = ["submit_at", "assign_at", "approved_paid_at", "created_payment", "last_update"]
+
+# storage dtypes of the crm export
+CRM_DTYPES = {
+    "mt_preleads_code": "category",
+    "mt_leads_code": "category",
+    "type": "category",
+    "campaign_name": "category",
+    "assigner": "category",
+    "email_sales": "category",
+    "m_status_code": "category",
+    "outlet_name": "category",
+    "owner_phone": "category",
+    "rating": "float32",
+    "pic_name": "category",
+    "full_name": "category",
+    "status": "uint8",
+    "m_sourceentry_code": "category",
+    "counter_followup": "float32",
+    "counter_meeting": "float32",
+    "channel_name": "category",
+    "reject_reason": "category",
+    "reject_note": "category"
+}
+
+
+# rating -> leads potential category
+RATING_CATEGORY = {
+    0: "Cold Leads",
+    1: "Cold Leads",
+    2: "Warm Leads",
+    3: "Warm Leads",
+    4: "Hot Leads",
+    5: "Hot Leads",
+}
+
+# status -> status code, anything else is junked
+STATUS_CODE = {
+    1: "unassigned",
+    2: "backlog",
+    3: "assigned",
+}
+
+# categories of every derived column, index position is the categorical code
+LEADS_POTENSIAL_CATEGORIES = ["Cold Leads", "Warm Leads", "Hot Leads", "Null"]
+HW_CATEGORIES = ["hw", "cold", "Null"]
+STATUS_CODE_CATEGORIES = ["unassigned", "backlog", "assigned", "junked"]
+PIPELINE_CATEGORIES = ["Pipeline Hot", "Pipeline Warm", "Pipeline Cold", "Pipeline Null"]
+DEAL_CATEGORIES = ["deal", "pipeline", "leads"]
+
+
+def _lookup_codes(values, table, categories, default):
+    # map raw values to categorical codes through a small lookup table
+    codes = np.full(len(values), categories.index(default), dtype="int8")
+    for key, label in table.items():
+        codes[values == key] = categories.index(label)
+    return codes
+
+
+def _status_flags(series):
+    # evaluate the m_status_code string checks once per category, then broadcast by code
+    if not pd.api.types.is_categorical_dtype(series):
+        series = series.astype("category")
+    labels = series.cat.categories.astype(str)
+    codes = series.cat.codes.to_numpy()
+
+    def broadcast(flags):
+        # code -1 is a missing value, str(nan) never matches any check
+        flags = np.append(np.asarray(flags, dtype=bool), False)
+        return flags[codes]
+
+    invoice = broadcast(labels.str.contains("INVOICE", regex=False))
+    payment = broadcast(labels.str.contains("PAYMENT", regex=False))
+    paid = broadcast(labels == "PAID")
+    return invoice, payment, paid
+
+
+def _categorical(codes, categories, index):
+    return pd.Series(pd.Categorical.from_codes(codes, categories=categories), index=index)
+
+
+def derive_lead_columns(dataframe):
+    # derive rating, status, activity and deal columns in a single vectorized pass
+    index = dataframe.index
+    rating = dataframe["rating"].to_numpy()
+    status = dataframe["status"].to_numpy()
+    invoice, payment, paid = _status_flags(dataframe["m_status_code"])
+
+    # cold, hot, warm
+    potensial = _lookup_codes(rating, RATING_CATEGORY, LEADS_POTENSIAL_CATEGORIES, "Null")
+    hot = potensial == LEADS_POTENSIAL_CATEGORIES.index("Hot Leads")
+    cold = potensial == LEADS_POTENSIAL_CATEGORIES.index("Cold Leads")
+    null = potensial == LEADS_POTENSIAL_CATEGORIES.index("Null")
+
+    # hw by rating
+    hw_by_rating = np.select([null, cold], [HW_CATEGORIES.index("Null"), HW_CATEGORIES.index("cold")],
+                             default=HW_CATEGORIES.index("hw")).astype("int8")
+
+    # unassigned, backlog, assigned, junked
+    status_code = _lookup_codes(status, STATUS_CODE, STATUS_CODE_CATEGORIES, "junked")
+
+    # total activity
+    total_activity = dataframe["counter_meeting"] + dataframe["counter_followup"]
+    activity = total_activity.to_numpy()
+
+    # pipeline
+    pipeline = np.select(
+        [invoice | hot, activity >= 2, activity <= 1],
+        [PIPELINE_CATEGORIES.index("Pipeline Hot"), PIPELINE_CATEGORIES.index("Pipeline Warm"),
+         PIPELINE_CATEGORIES.index("Pipeline Cold")],
+        default=PIPELINE_CATEGORIES.index("Pipeline Null"),
+    ).astype("int8")
+
+    # hw by activity, every pipeline level maps one to one
+    hw_by_activity = np.array([HW_CATEGORIES.index("hw"), HW_CATEGORIES.index("hw"),
+                               HW_CATEGORIES.index("cold"), HW_CATEGORIES.index("Null")], dtype="int8")[pipeline]
+
+    # deal or no deal
+    deal = np.select(
+        [payment, invoice, paid],
+        [DEAL_CATEGORIES.index("deal"), DEAL_CATEGORIES.index("pipeline"), DEAL_CATEGORIES.index("deal")],
+        default=DEAL_CATEGORIES.index("leads"),
+    ).astype("int8")
+
+    dataframe["leads_potensial_category"] = _categorical(potensial, LEADS_POTENSIAL_CATEGORIES, index)
+    dataframe["hw_by_rating"] = _categorical(hw_by_rating, HW_CATEGORIES, index)
+    dataframe["status_code"] = _categorical(status_code, STATUS_CODE_CATEGORIES, index)
+    dataframe["total_activity"] = total_activity
+    dataframe["pipeline_by_activity"] = _categorical(pipeline, PIPELINE_CATEGORIES, index)
+    dataframe["hw_by_activity"] = _categorical(hw_by_activity, HW_CATEGORIES, index)
+    dataframe["deal"] = _categorical(deal, DEAL_CATEGORIES, index)
+
+    return dataframe
+
+
+def read_crm_csv(file, since=None, chunksize=500_000):
+    # parse the crm export and derive every dashboard column, with since set only
+    # rows updated at or after it are kept (filtered while streaming) and derived.
+    # rows updated within the same timestamp as since are read again, upserting
+    # them by key is idempotent
+    if since is None:
+        dataframe = pd.read_csv(file, low_memory=False, parse_dates=CRM_DATES, dtype=CRM_DTYPES)
+    else:
+        chunks = pd.read_csv(file, low_memory=False, parse_dates=CRM_DATES, dtype=CRM_DTYPES, chunksize=chunksize)
+        dataframe = pd.concat([chunk.loc[chunk["last_update"] >= since] for chunk in chunks], ignore_index=True)
+        # chunks with different categories concat to object, restore the storage dtypes
+        dataframe = dataframe.astype({column: dtype for column, dtype in CRM_DTYPES.items() if column in dataframe})
+
+    # normalize date
+    dataframe["submit_at"] = dataframe["submit_at"].dt.normalize()
+    dataframe["assign_at"] = dataframe["assign_at"].dt.normalize()
+    dataframe["approved_paid_at"] = dataframe["approved_paid_at"].dt.normalize()
+    dataframe["created_payment"] = dataframe["created_payment"].dt.normalize()
+
+    # cold/warm/hot, status code, activity pipeline and deal in one vectorized pass
+    dataframe = derive_lead_columns(dataframe)
+
+    # formatting phone number
+    dataframe["owner_phone"] = normalize_phone(dataframe["owner_phone"])
+
+    # remove duplicates
+    dataframe.drop_duplicates(subset=["mt_preleads_code"], inplace=True)
+
+    # dates are already parsed by read_csv
+    return compact_frame(dataframe, "crm", date_columns=[])
+
+
+def load_crm(filesystem=None, storage_options=None):
+    # the csv is only downloaded and parsed again when its GCS generation changes,
+    # otherwise the derived frame is read back from the local parquet snapshot.
+    # changes are applied incrementally: only leads updated since the snapshot's
+    # latest last_update are derived and upserted by mt_preleads_code
+    return load_snapshot(CRM_URL, read_crm_csv, columns=CRM_COLUMNS, filesystem=filesystem,
+                         storage_options=storage_options, key="mt_preleads_code",
+                         watermark="last_update", delta_url=CRM_DELTA_URL)
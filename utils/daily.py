@@ -0,0 +1,155 @@
+import datetime
+import json
+import os
+import tempfile
+import uuid
+
+import pandas as pd
+
+from utils.rollup import ATTRIBUTION_DIMENSIONS, FREE_TEXT_DIMENSIONS, Rollup, attribution_rollup, free_text_rollup
+from utils.snapshot import resolve_url
+
+
+# directory (local or gs://) holding one folder per closed day, with a folder of
+# snapshot files per job run and a pointer file naming the complete run
+DAILY_DIR = os.environ.get("DAILY_SNAPSHOT_DIR", os.path.join(tempfile.gettempdir(), "free-text-v3", "daily"))
+
+# matched crm rows kept per day. attribution is not additive over days (leads are
+# deduplicated and filtered on submit date over the whole range), so the matches
+# are stored and the attribution cube is built from them for any range
+MATCH_COLUMNS = ATTRIBUTION_DIMENSIONS + ["mt_leads_code", "submit_at"]
+
+# frame files of a day
+FRAMES = ("phones", "matches", "free_text")
+
+# pointer to the run folder of a day, written last. a day without it is
+# incomplete and computed live instead
+DAY_MARKER = "CURRENT"
+
+# frame file of days written before run folders, whose files sit in the day folder
+LEGACY_MARKER = "free_text.parquet"
+
+
+def day_snapshot(free_text, phone_index, crm_updated_at=None):
+    # snapshot frames of the free text rows of one day: rollup cells, distinct
+    # phones and every crm lead matching a phone with its submit date, plus the
+    # time of the crm data the lead status was taken from
+    matches = phone_index.matches(free_text, on="phone", date="submit_at")
+    return {
+        "phones": pd.DataFrame({"phone": free_text["phone"].dropna().unique()}).astype(str),
+        "matches": matches[MATCH_COLUMNS],
+        "free_text": free_text_rollup(free_text).cells,
+        "crm_updated_at": None if crm_updated_at is None else pd.Timestamp(crm_updated_at).isoformat(),
+    }
+
+
+def write_day(day, snapshot, directory=DAILY_DIR, filesystem=None):
+    # files of a run are never rewritten: each run writes a new folder and then
+    # moves the pointer to it, so readers see either the previous or the new run
+    fs, root = resolve_url(directory, filesystem)
+    day_folder = f"{root}/{day:%Y-%m-%d}"
+    run = f"{datetime.datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+    folder = f"{day_folder}/{run}"
+    fs.makedirs(folder, exist_ok=True)
+    with fs.open(f"{folder}/meta.json", "w") as file:
+        json.dump({"crm_updated_at": snapshot.get("crm_updated_at")}, file)
+    for name in FRAMES:
+        with fs.open(f"{folder}/{name}.parquet", "wb") as file:
+            snapshot[name].to_parquet(file, index=False)
+
+    previous = _run_folder(fs, day_folder)
+    with fs.open(f"{day_folder}/{DAY_MARKER}.tmp", "w") as file:
+        file.write(run)
+    fs.mv(f"{day_folder}/{DAY_MARKER}.tmp", f"{day_folder}/{DAY_MARKER}")
+
+    # the previous run stays for readers that resolved the pointer before the move
+    keep = {folder, previous}
+    for path in fs.ls(day_folder, detail=False):
+        if fs.isdir(path) and path.rstrip("/") not in keep:
+            fs.rm(path, recursive=True)
+    if previous != day_folder:
+        # files of a day written before run folders, unused once a run replaced them
+        for name in FRAMES + ("meta",):
+            for path in fs.glob(f"{day_folder}/{name}.*"):
+                fs.rm(path)
+
+
+def _run_folder(fs, day_folder):
+    # folder holding the complete snapshot files of a day, None without one
+    if fs.exists(f"{day_folder}/{DAY_MARKER}"):
+        with fs.open(f"{day_folder}/{DAY_MARKER}", "r") as file:
+            return f"{day_folder}/{file.read().strip()}"
+    if fs.exists(f"{day_folder}/{LEGACY_MARKER}"):
+        return day_folder
+    return None
+
+
+def closed_days(start, end, directory=DAILY_DIR, filesystem=None):
+    # days within [start, end] with a complete snapshot
+    fs, root = resolve_url(directory, filesystem)
+    days = pd.date_range(start, end, freq="D").date
+    return [day for day in days
+            if fs.exists(f"{root}/{day:%Y-%m-%d}/{DAY_MARKER}") or fs.exists(f"{root}/{day:%Y-%m-%d}/{LEGACY_MARKER}")]
+
+
+def read_days(days, directory=DAILY_DIR, filesystem=None):
+    # {name: frame} of the snapshots of days concatenated in day order, and under
+    # crm_updated_at the oldest crm time their lead status was taken from
+    fs, root = resolve_url(directory, filesystem)
+    frames = {name: [] for name in FRAMES}
+    updated = []
+    for day in sorted(days):
+        folder = _run_folder(fs, f"{root}/{day:%Y-%m-%d}")
+        for name in frames:
+            with fs.open(f"{folder}/{name}.parquet", "rb") as file:
+                frames[name].append(pd.read_parquet(file))
+        if fs.exists(f"{folder}/meta.json"):
+            with fs.open(f"{folder}/meta.json", "r") as file:
+                updated.append(json.load(file).get("crm_updated_at"))
+    snapshot = {name: pd.concat(parts, ignore_index=True) if parts else None for name, parts in frames.items()}
+    updated = [pd.Timestamp(value) for value in updated if value]
+    snapshot["crm_updated_at"] = min(updated) if updated else None
+    return snapshot
+
+
+def combine(start, end, snapshot, live=None):
+    # free text cube, attribution cube and distinct phone count of [start, end]
+    # from the closed day snapshot and the live snapshot of the remaining days
+    parts = [part for part in (snapshot, live) if part is not None and part["free_text"] is not None]
+    if not parts:
+        return (free_text_rollup(pd.DataFrame(columns=FREE_TEXT_DIMENSIONS + ["phone"])),
+                attribution_rollup(pd.DataFrame(columns=MATCH_COLUMNS)), 0)
+
+    free_text = Rollup(parts[0]["free_text"], FREE_TEXT_DIMENSIONS)
+    for part in parts[1:]:
+        free_text.update(Rollup(part["free_text"], FREE_TEXT_DIMENSIONS))
+
+    # leads submitted within the range, one row per mt_leads_code credited to the
+    # newest free text row (days newest first, rows of a day keep their order)
+    matches = pd.concat([part["matches"] for part in parts], ignore_index=True)
+    submitted = matches["submit_at"]
+    matches = matches.loc[(submitted >= pd.Timestamp(start)) & (submitted < pd.Timestamp(end) + pd.Timedelta(days=1))]
+    matches = matches.sort_values("create_date", ascending=False, kind="stable").drop_duplicates(subset=["mt_leads_code"])
+
+    phones = pd.concat([part["phones"] for part in parts], ignore_index=True)["phone"]
+    return free_text, attribution_rollup(matches), phones.nunique()
+
+
+def range_rollups(start, end, free_text, phone_index, directory=DAILY_DIR, filesystem=None):
+    # cubes of [start, end] read from the snapshots of closed days, only the other
+    # days (today, or days the job has not written yet) are computed live from
+    # free_text(first, last), a SharedFrame covering those days sorted by
+    # create_date newest first, and phone_index(). returns the free text cube,
+    # the attribution cube, the distinct phone count and the oldest crm time the
+    # lead status of closed days was taken from (None without closed days)
+    closed = closed_days(start, min(end, datetime.date.today() - datetime.timedelta(days=1)), directory, filesystem)
+    remaining = [day for day in pd.date_range(start, end, freq="D").date if day not in set(closed)]
+
+    live = None
+    if remaining:
+        # only the days without a snapshot are queried
+        shared = free_text(remaining[0], remaining[-1])
+        rows = pd.concat([shared.view(start=day, end=day) for day in remaining], ignore_index=True)
+        live = day_snapshot(rows, phone_index())
+    snapshot = read_days(closed, directory, filesystem)
+    return (*combine(start, end, snapshot, live), snapshot["crm_updated_at"])
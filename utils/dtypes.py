@@ -0,0 +1,75 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+# object columns with at most this share of distinct values become categoricals
+MAX_CATEGORY_RATIO = 0.5
+
+# share of non-null values that must parse for an object column to become datetime64
+MIN_DATE_PARSE_RATIO = 0.95
+
+# column name endings profiled as dates when no date columns are given
+DATE_SUFFIXES = ("date", "_at")
+
+# loader name -> (bytes before, bytes after) of its last compaction
+_report = {}
+_report_lock = threading.Lock()
+
+
+def _lossless(original, converted):
+    return bool(((original == converted) | (original.isna() & converted.isna())).all())
+
+
+def plan_dtypes(frame, date_columns=None, detect_dates=True):
+    # target dtype of every column that can be stored more compactly
+    plan = {}
+    for column in frame.columns:
+        series = frame[column]
+        if pd.api.types.is_categorical_dtype(series) or pd.api.types.is_bool_dtype(series):
+            continue
+
+        if pd.api.types.is_integer_dtype(series):
+            downcast = pd.to_numeric(series, downcast="unsigned" if (series.dropna() >= 0).all() else "integer")
+            if downcast.dtype != series.dtype:
+                plan[column] = downcast.dtype
+        elif pd.api.types.is_float_dtype(series):
+            downcast = pd.to_numeric(series, downcast="float")
+            if downcast.dtype != series.dtype and _lossless(series, downcast.astype(series.dtype)):
+                plan[column] = downcast.dtype
+        elif pd.api.types.is_object_dtype(series):
+            non_null = series.dropna()
+            is_date = column in date_columns if date_columns is not None else (
+                detect_dates and str(column).endswith(DATE_SUFFIXES))
+            if is_date and len(non_null):
+                parsed = pd.to_datetime(non_null, errors="coerce")
+                if parsed.notna().mean() >= MIN_DATE_PARSE_RATIO:
+                    plan[column] = np.dtype("datetime64[ns]")
+                    continue
+            if len(non_null) and non_null.nunique() <= MAX_CATEGORY_RATIO * len(non_null):
+                plan[column] = "category"
+    return plan
+
+
+def compact_frame(frame, name=None, date_columns=None, detect_dates=True):
+    # convert frame to the planned dtypes and record the bytes saved under name
+    before = int(frame.memory_usage(deep=True).sum())
+    plan = plan_dtypes(frame, date_columns=date_columns, detect_dates=detect_dates)
+    for column, dtype in plan.items():
+        if isinstance(dtype, np.dtype) and dtype.kind == "M":
+            frame[column] = pd.to_datetime(frame[column], errors="coerce")
+        else:
+            frame[column] = frame[column].astype(dtype)
+
+    if name is not None:
+        after = int(frame.memory_usage(deep=True).sum())
+        with _report_lock:
+            _report[name] = (before, after)
+    return frame
+
+
+def compaction_report():
+    # {loader name: (bytes before, bytes after)} of the last compaction of each loader
+    with _report_lock:
+        return dict(_report)
@@ -0,0 +1,80 @@
+import io
+
+import streamlit as st
+import xlsxwriter
+
+
+# rows converted and written per chunk
+CHUNK_ROWS = 10_000
+
+MIME_TYPES = {
+    "xlsx": "application/vnd.ms-excel",
+    "csv": "text/csv",
+    "parquet": "application/octet-stream",
+}
+
+
+def _chunks(frame, chunk_rows):
+    for offset in range(0, len(frame), chunk_rows):
+        chunk = frame.iloc[offset:offset + chunk_rows]
+        # python scalars with None for missing values, which xlsxwriter writes as blanks
+        yield chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None)
+
+
+def write_excel(frame, file, chunk_rows=CHUNK_ROWS, sheet_name="Sheet1"):
+    # stream frame into a single worksheet, xlsxwriter's constant_memory mode
+    # flushes every finished row so only one row is held by the writer
+    workbook = xlsxwriter.Workbook(file, {
+        "constant_memory": True,
+        "remove_timezone": True,
+        "default_date_format": "yyyy-mm-dd hh:mm:ss",
+    })
+    worksheet = workbook.add_worksheet(sheet_name)
+    worksheet.write_row(0, 0, [str(column) for column in frame.columns], workbook.add_format({"bold": True}))
+
+    row = 1
+    for rows in _chunks(frame, chunk_rows):
+        for values in rows:
+            worksheet.write_row(row, 0, values)
+            row += 1
+    workbook.close()
+
+
+def write_csv(frame, file, chunk_rows=CHUNK_ROWS):
+    # chunked csv, only one chunk is converted to text at a time
+    for offset in range(0, max(len(frame), 1), chunk_rows):
+        frame.iloc[offset:offset + chunk_rows].to_csv(file, index=False, header=offset == 0)
+
+
+def export_bytes(frame, fmt="xlsx"):
+    buffer = io.BytesIO()
+    if fmt == "xlsx":
+        write_excel(frame, buffer)
+    elif fmt == "csv":
+        text = io.TextIOWrapper(buffer, encoding="utf-8", newline="")
+        write_csv(frame, text)
+        text.flush()
+        text.detach()
+    elif fmt == "parquet":
+        frame.to_parquet(buffer, index=False)
+    else:
+        raise ValueError(f"unknown export format: {fmt}")
+    return buffer.getvalue()
+
+
+def download_on_demand(frame, file_name, key, version, fmt="xlsx", label="Download Data in Excel"):
+    # the file is only generated after "Prepare download" is clicked, and its
+    # bytes are kept in session state for this version of the data (e.g. a hash
+    # of the selection) so reruns and repeated downloads do not rebuild it
+    state_key = f"{key}:export"
+    prepared = st.session_state.get(state_key)
+    if prepared is not None and prepared[0] != (version, fmt):
+        prepared = st.session_state[state_key] = None
+
+    if prepared is None:
+        if st.button("Prepare download", key=f"{key}:prepare"):
+            with st.spinner("Preparing file"):
+                prepared = st.session_state[state_key] = ((version, fmt), export_bytes(frame, fmt))
+
+    if prepared is not None:
+        st.download_button(label=label, data=prepared[1], file_name=file_name, mime=MIME_TYPES[fmt], key=f"{key}:download")
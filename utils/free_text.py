@@ -0,0 +1,25 @@
+import pandas as pd
+
+from utils.campaign import attach_campaign_dimension
+from utils.dtypes import compact_frame
+from utils.phone import normalize_phone
+
+
+def prepare_free_text(dataframe):
+    # derive campaign source, adset and normalized phone of the free text rows
+    dataframe = attach_campaign_dimension(dataframe)
+
+    dataframe['create_date'] = pd.to_datetime(dataframe['create_date'], errors='coerce')
+    # newest first, as the original ORDER BY create_date DESC returned them: the
+    # crm join credits each lead to the newest free text row of its phone
+    dataframe = dataframe.sort_values('create_date', ascending=False, kind='stable', na_position='last')
+    dataframe['create_date'] = dataframe['create_date'].dt.normalize()
+
+    # formatting phone number
+    dataframe['phone'] = normalize_phone(dataframe['phone'])
+
+    # remove undefined 
+    dataframe = dataframe.loc[dataframe['campaign_source'] != 'undefined'].copy()
+
+    # selected and any remaining text columns become categoricals
+    return compact_frame(dataframe, "free_text", date_columns=[])
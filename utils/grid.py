@@ -0,0 +1,96 @@
+import math
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode
+
+
+def _selected_positions(selected_rows):
+    # window positions of the rows AgGrid reports as selected
+    return [int(row["_selectedRowNodeInfo"]["nodeId"]) for row in selected_rows]
+
+
+def _sort_order(dataframe, state, column, ascending):
+    # positions of dataframe rows sorted on column, kept until the frame or the sort changes
+    sort = (column, ascending)
+    if state.get("sort") != sort or state.get("order_index") is not dataframe.index:
+        if column is None:
+            order = np.arange(len(dataframe))
+        else:
+            values = dataframe[column].reset_index(drop=True)
+            order = values.sort_values(ascending=ascending, kind="stable", na_position="last").index.to_numpy()
+        state["sort"], state["order_index"], state["order"] = sort, dataframe.index, order
+    return state["order"]
+
+
+def paged_grid(dataframe, key, row_key=None, page_size=20, selectable=False, **aggrid_kwargs):
+    # render only the page window of dataframe in AgGrid instead of the whole frame.
+    # AgGrid only sees the window, so its own sort and filter menus are disabled
+    # and the whole frame is sorted here before slicing.
+    #
+    # with selectable set, the selection is kept in session state as a set of row
+    # keys (the row_key column, or the index when row_key is None) across pages
+    # and reruns, together with a boolean mask over dataframe that only the
+    # current page's positions are written to. returns (grid_response, selected_mask)
+    state_key = f"{key}:state"
+    if state_key not in st.session_state:
+        st.session_state[state_key] = {"selected": set(), "index": None, "mask": None, "rendered": None}
+    state = st.session_state[state_key]
+    keys = dataframe.index if row_key is None else pd.Index(dataframe[row_key])
+
+    # the mask is rebuilt from the key set only when the frame itself changed
+    if state["index"] is not dataframe.index or state["mask"] is None or len(state["mask"]) != len(dataframe):
+        state["mask"] = np.asarray(keys.isin(state["selected"]), dtype=bool)
+        state["index"] = dataframe.index
+
+    # sort and page navigation
+    pages = max(1, math.ceil(len(dataframe) / page_size))
+    col1, col2, col3, col4 = st.columns([1, 2, 1, 3])
+    page = int(col1.number_input("Page", min_value=1, max_value=pages, value=1, step=1, key=f"{key}:page"))
+    sort_column = col2.selectbox("Sort by", [None] + list(dataframe.columns), key=f"{key}:sort",
+                                 format_func=lambda column: "(original order)" if column is None else str(column))
+    ascending = col3.radio("Order", ["Ascending", "Descending"], key=f"{key}:order") == "Ascending"
+    col4.caption(f"Page {page} of {pages:,} ({len(dataframe):,} rows)")
+    offset = (page - 1) * page_size
+    positions = _sort_order(dataframe, state, sort_column, ascending)[offset:offset + page_size]
+    window = dataframe.iloc[positions]
+
+    gb = GridOptionsBuilder.from_dataframe(window)
+    gb.configure_default_column(sortable=False, filter=False)
+    if selectable:
+        gb.configure_selection(
+            selection_mode="multiple",
+            use_checkbox=True,
+            pre_selected_rows=np.flatnonzero(state["mask"][positions]).tolist(),
+        )
+    gridOptions = gb.build()
+
+    # every page of every sort is its own component, so its pre-selected rows apply on mount
+    component_key = f"{key}:grid:{page}:{sort_column}:{ascending}"
+    grid_response = AgGrid(
+        window,
+        gridOptions=gridOptions,
+        update_mode=GridUpdateMode.SELECTION_CHANGED if selectable else GridUpdateMode.NO_UPDATE,
+        key=component_key,
+        **aggrid_kwargs,
+    )
+
+    if not selectable:
+        return grid_response, None
+
+    # a freshly mounted grid returns no selection yet, keep the stored one
+    if state["rendered"] == component_key:
+        page_mask = np.zeros(len(window), dtype=bool)
+        page_mask[_selected_positions(grid_response["selected_rows"])] = True
+        window_keys = keys[positions]
+        state["selected"].difference_update(window_keys)
+        state["selected"].update(window_keys[page_mask])
+        state["mask"][positions] = page_mask
+    state["rendered"] = component_key
+
+    return grid_response, state["mask"]
+
+
+def clear_selection(key):
+    st.session_state.pop(f"{key}:state", None)
@@ -0,0 +1,135 @@
+import asyncio
+import datetime
+import json
+
+import aiohttp
+import pandas as pd
+
+from utils.cache import RequestCache
+from utils.dtypes import compact_frame
+from utils.shared import freeze
+from utils.shared_cache import SharedCache, default_backend
+from utils.writer import lead_ids
+
+
+# endpoint of the landing page form submissions
+INTEGRATION_URL = "https://majoo.id/api/report/integration?"
+
+# responses are fresh for 30 minutes and served stale for up to 6 hours while refreshing
+INTEGRATION_TTL = 30 * 60
+INTEGRATION_STALE_TTL = 6 * 60 * 60
+
+# windows that ended before today no longer change and are kept for a day
+CLOSED_WINDOW_TTL = 24 * 60 * 60
+
+# upper bound of cached responses per process
+INTEGRATION_MAX_BYTES = 512 * 1024 * 1024
+
+# days per request, concurrent requests and attempts per window
+WINDOW_DAYS = 1
+MAX_CONCURRENCY = 6
+MAX_ATTEMPTS = 4
+BACKOFF = 0.5
+
+
+def _frame_size(dataframe):
+    return int(dataframe.memory_usage(deep=True).sum())
+
+
+def split_windows(start, end, days=WINDOW_DAYS):
+    # split [start, end] into windows aligned on a fixed day grid, so widening the
+    # range reuses every window already fetched
+    windows = []
+    ordinal = start.toordinal()
+    while ordinal <= end.toordinal():
+        window_end = min(ordinal - ordinal % days + days - 1, end.toordinal())
+        windows.append((datetime.date.fromordinal(ordinal), datetime.date.fromordinal(window_end)))
+        ordinal = window_end + 1
+    return windows
+
+
+async def _fetch_window(session, semaphore, url, window, timeout):
+    start, end = window
+    params = {"startdate": str(start), "enddate": str(end)}
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            async with semaphore:
+                async with session.get(url, params=params, timeout=aiohttp.ClientTimeout(total=timeout)) as res:
+                    res.raise_for_status()
+                    body = await res.read()
+            # parse each window into its own chunk as soon as it arrives
+            return pd.DataFrame(json.loads(body)["data"])
+        except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+            # client errors other than rate limiting will not succeed on retry
+            status = getattr(error, "status", None)
+            if attempt == MAX_ATTEMPTS - 1 or (status is not None and 400 <= status < 500 and status != 429):
+                raise
+            await asyncio.sleep(BACKOFF * 2 ** attempt)
+
+
+async def _fetch_windows(url, windows, timeout, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    async with aiohttp.ClientSession() as session:
+        return await asyncio.gather(*(_fetch_window(session, semaphore, url, window, timeout) for window in windows))
+
+
+def fetch_integration(start, end, url=INTEGRATION_URL, window_cache=None, timeout=120,
+                      days=WINDOW_DAYS, concurrency=MAX_CONCURRENCY):
+    # submissions between start and end date as a dataframe, fetched as concurrent
+    # day windows; windows found in window_cache are not requested again
+    windows = split_windows(start, end, days=days)
+    chunks = {window: window_cache.lookup((url, window)) if window_cache else None for window in windows}
+    missing = [window for window, chunk in chunks.items() if chunk is None]
+
+    if missing:
+        today = datetime.date.today()
+        for window, chunk in zip(missing, asyncio.run(_fetch_windows(url, missing, timeout, concurrency))):
+            chunks[window] = chunk
+            if window_cache:
+                window_cache.put((url, window), chunk, ttl=CLOSED_WINDOW_TTL if window[1] < today else INTEGRATION_TTL)
+
+    frames = [chunks[window] for window in windows if len(chunks[window])]
+    if not frames:
+        return pd.DataFrame()
+
+    # rows are indexed by their stable lead id, used to track grid selections
+    dataframe = pd.concat(frames, ignore_index=True)
+    dataframe.index = lead_ids(dataframe)
+
+    # dates stay text so saved rows keep the format already stored in BigQuery.
+    # the frame is shared by every session, so its buffers are made read-only
+    return freeze(compact_frame(dataframe, "integration", detect_dates=False))
+
+
+def make_integration_cache(url=INTEGRATION_URL, ttl=INTEGRATION_TTL,
+                           stale_ttl=INTEGRATION_STALE_TTL, max_bytes=INTEGRATION_MAX_BYTES, backend=None):
+    # request cache keyed on (start, end) over a cache of fetched windows,
+    # point url at a stub server to run offline. with a shared cache backend
+    # the ranges fetched by one process are reused by every other one
+    window_cache = RequestCache(None, ttl=ttl, max_bytes=max_bytes, sizeof=_frame_size)
+
+    def load(key):
+        return fetch_integration(*key, url=url, window_cache=window_cache)
+
+    if backend is not None:
+        shared = SharedCache(load, ttl=ttl, stale_ttl=stale_ttl, backend=backend, namespace=f"integration:{url}")
+        load = lambda key: freeze(shared.get(key))
+
+    cache = RequestCache(
+        load,
+        ttl=ttl,
+        stale_ttl=stale_ttl,
+        max_bytes=max_bytes,
+        sizeof=_frame_size,
+    )
+    cache.windows = window_cache
+    return cache
+
+
+# shared by every session of this process and, through the shared cache
+# backend, by every replica. cached frames are read-only
+integration_cache = make_integration_cache(backend=default_backend())
+
+
+def get_integration_data(start, end):
+    return integration_cache.get((start, end))
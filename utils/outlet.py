@@ -0,0 +1,133 @@
+import os
+import re
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from utils.dtypes import compact_frame
+from utils.snapshot import stream_snapshot
+
+
+# point OUTLET_SOURCE_URL at a local csv (e.g. file:///data/outlet_data.csv) to run without GCS
+OUTLET_URL = os.environ.get("OUTLET_SOURCE_URL", "gs://lead-analytics-bucket/crm_db/outlet_data.csv")
+
+# rows parsed from the csv and read back from the snapshot at a time
+CHUNK_ROWS = 200_000
+
+# values read as numbers: no leading zeros (phones) and at most 15 integer
+# digits (long ids), so every value survives the conversion unchanged
+NUMBER_PATTERN = r"-?(?:0|[1-9]\d{0,14})(?:\.\d+)?"
+
+# name parts of columns always kept as text
+TEXT_COLUMN_HINTS = ("id", "phone", "hp", "code", "number")
+
+# text columns with more distinct values are filtered by substring instead of a value list
+MAX_OPTIONS = 500
+
+
+def _text_column(name):
+    # id and phone like columns stay text whatever their values look like
+    return any(token in TEXT_COLUMN_HINTS for token in re.split(r"[^a-z0-9]+", str(name).lower()))
+
+
+def _narrow_kinds(chunk, kinds, seen):
+    # downgrade {column: "integer" | "decimal" | None} with the values of chunk
+    for column, kind in kinds.items():
+        if kind is None:
+            continue
+        values = chunk[column].dropna().str.strip()
+        if len(values):
+            seen.add(column)
+        if not values.str.fullmatch(NUMBER_PATTERN).all():
+            kinds[column] = None
+        elif kind == "integer" and values.str.contains(".", regex=False).any():
+            kinds[column] = "decimal"
+
+
+def outlet_batches(file, chunksize=CHUNK_ROWS):
+    # csv chunks with every column kept as text, except columns whose every value
+    # in the whole file is a plain number: those become Int64 or float64. the file
+    # is read twice so no value is ever coerced to missing
+    def chunks():
+        # the first column is the index written by the export. only empty cells
+        # are missing, markers like "N/A" are kept as text
+        for chunk in pd.read_csv(file, dtype=str, keep_default_na=False, na_values=[""], chunksize=chunksize):
+            yield chunk.drop(columns=chunk.columns[0])
+
+    kinds, seen = None, set()
+    for chunk in chunks():
+        if kinds is None:
+            kinds = {column: None if _text_column(column) else "integer" for column in chunk.columns}
+        _narrow_kinds(chunk, kinds, seen)
+    kinds = {column: kind for column, kind in (kinds or {}).items() if kind is not None and column in seen}
+
+    file.seek(0)
+    for chunk in chunks():
+        for column, kind in kinds.items():
+            values = pd.to_numeric(chunk[column].str.strip())
+            chunk[column] = values.astype("Int64" if kind == "integer" else "float64")
+        yield chunk
+
+
+def load_outlet_snapshot(url=OUTLET_URL, filesystem=None, storage_options=None):
+    # path of the parquet snapshot of the outlet csv, rebuilt chunk by chunk when the csv changes
+    return stream_snapshot(url, outlet_batches, storage_options=storage_options, filesystem=filesystem)
+
+
+def outlet_columns(path):
+    # {column: "number" or "text"} of the snapshot
+    return {
+        field.name: "number" if pa.types.is_floating(field.type) or pa.types.is_integer(field.type) else "text"
+        for field in pq.read_schema(path)
+    }
+
+
+def column_range(path, column):
+    # (min, max) of a number column, None when it has no values
+    bounds = pc.min_max(pq.read_table(path, columns=[column]).column(0)).as_py()
+    return None if bounds["min"] is None else (bounds["min"], bounds["max"])
+
+
+def column_options(path, column, limit=MAX_OPTIONS):
+    # sorted distinct values of a text column, None when there are more than limit
+    values = pc.unique(pq.read_table(path, columns=[column]).column(0)).drop_null()
+    if len(values) > limit:
+        return None
+    return sorted(values.to_pylist())
+
+
+def _filter_mask(frame, filters):
+    # rows of frame matching every (column, op, value) filter
+    mask = np.ones(len(frame), dtype=bool)
+    for column, op, value in filters:
+        values = frame[column]
+        if op == "in":
+            matches = values.isin(value)
+        elif op == "between":
+            matches = values.between(*value)
+        elif op == "contains":
+            matches = values.str.contains(value, case=False, regex=False, na=False)
+        else:
+            raise ValueError(f"unknown filter operator {op!r}")
+        # nullable Int64 columns give a boolean result with missing values
+        mask &= matches.to_numpy(dtype=bool, na_value=False)
+    return mask
+
+
+def read_outlet(path, columns=None, filters=(), batch_rows=CHUNK_ROWS):
+    # selected columns of the snapshot rows matching filters. the snapshot is read
+    # batch by batch and filtered as it streams, so only matching rows are kept
+    columns = list(columns or pq.read_schema(path).names)
+    needed = columns + [column for column, _, _ in filters if column not in columns]
+
+    parts = []
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_rows, columns=needed):
+        frame = batch.to_pandas()
+        parts.append(frame.loc[_filter_mask(frame, filters), columns])
+
+    dataframe = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=columns)
+    # text stays as read, only repeated values become categoricals
+    return compact_frame(dataframe.reset_index(drop=True), "outlet", detect_dates=False)
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+
+def _normalize_strings(phones):
+    # "8..." -> "628...", "0..." -> "62...", "620..." -> "62..."
+    starts_8 = phones.str.startswith("8", na=False)
+    starts_0 = phones.str.startswith("0", na=False)
+    starts_620 = ~starts_8 & ~starts_0 & phones.str.startswith("620", na=False)
+
+    normalized = phones.copy()
+    normalized[starts_8] = "62" + phones[starts_8]
+    normalized[starts_0] = "62" + phones[starts_0].str[1:]
+    normalized[starts_620] = "62" + phones[starts_620].str[3:]
+    return normalized
+
+
+def normalize_phone(series):
+    # normalize indonesian phone numbers to the 62 prefix, missing values stay missing
+    if pd.api.types.is_categorical_dtype(series):
+        # normalize each distinct number once, then remap the codes since
+        # different raw numbers can collapse into the same normalized one
+        categories = series.cat.categories
+        normalized = _normalize_strings(pd.Series(categories.astype(str), dtype=object))
+        new_codes, new_categories = pd.factorize(normalized)
+        codes = series.cat.codes.to_numpy()
+        remapped = np.where(codes == -1, -1, new_codes[codes])
+        return pd.Series(pd.Categorical.from_codes(remapped, categories=new_categories),
+                         index=series.index, name=series.name)
+
+    phones = series.astype(str).where(series.notna())
+    return _normalize_strings(phones.astype(object))
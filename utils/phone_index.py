@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+
+# crm columns carried into the attribution join
+JOIN_COLUMNS = ["mt_leads_code", "owner_phone", "m_status_code", "deal"]
+
+
+def _hash_phones(series):
+    # uint64 hash of every phone, categoricals are hashed once per category
+    if pd.api.types.is_categorical_dtype(series):
+        categories = pd.util.hash_array(series.cat.categories.astype(str).to_numpy(dtype=object))
+        codes = series.cat.codes.to_numpy()
+        return np.where(codes == -1, 0, categories[codes]).astype("uint64"), codes != -1
+    valid = series.notna().to_numpy()
+    hashes = pd.util.hash_array(np.where(valid, series.astype(str).to_numpy(dtype=object), ""))
+    return hashes, valid
+
+
+class PhoneIndex:
+    # crm leads sorted by (phone hash, row order) so matches of a phone are a contiguous block
+
+    def __init__(self, crm, phone="owner_phone", date="submit_at", columns=None):
+        columns = columns or JOIN_COLUMNS
+        hashes, valid = _hash_phones(crm[phone])
+        valid &= crm["mt_leads_code"].notna().to_numpy()
+
+        positions = np.flatnonzero(valid)
+        order = np.argsort(hashes[positions], kind="stable")
+        self.positions = positions[order]
+        self.hashes = hashes[self.positions]
+        self.dates = crm[date].to_numpy(dtype="datetime64[ns]")[self.positions]
+        self.phones = crm[phone].astype(str).to_numpy(dtype=object)[self.positions]
+        self.frame = crm[columns].iloc[self.positions].reset_index(drop=True)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def probe(self, phones, start=None, end=None):
+        # (left, right) row pairs where phones[left] owns index row right and the
+        # lead was submitted within [start, end] (open ends are unbounded), in
+        # left then crm order
+        hashes, valid = _hash_phones(phones)
+        lo = np.searchsorted(self.hashes, hashes, side="left")
+        hi = np.searchsorted(self.hashes, hashes, side="right")
+        counts = np.where(valid, hi - lo, 0)
+
+        left = np.repeat(np.arange(len(hashes)), counts)
+        # offsets of every match inside its block
+        starts = np.repeat(lo - np.concatenate(([0], np.cumsum(counts)[:-1])), counts)
+        right = starts + np.arange(len(left))
+
+        if start is not None or end is not None:
+            dates = self.dates[right]
+            keep = np.ones(len(right), dtype=bool)
+            if start is not None:
+                keep &= dates >= np.datetime64(start, "ns")
+            if end is not None:
+                keep &= dates < np.datetime64(end, "ns") + np.timedelta64(1, "D")
+            left, right = left[keep], right[keep]
+
+        # guard against hash collisions
+        same = phones.astype(str).to_numpy(dtype=object)[left] == self.phones[right]
+        return left[same], right[same]
+
+    def matches(self, left_frame, on, start=None, end=None, date=None):
+        # every (left_frame row, crm lead) pair of the probe, with the lead's
+        # submit date added as column date when given
+        left, right = self.probe(left_frame[on], start, end)
+        merged = left_frame.iloc[left].reset_index(drop=True)
+        crm = self.frame.iloc[right].reset_index(drop=True)
+        for column in crm.columns:
+            merged[column] = crm[column]
+        if date is not None:
+            merged[date] = self.dates[right]
+        return merged
+
+    def join(self, left_frame, on, start, end):
+        # leads of left_frame found in the crm, one row per mt_leads_code, equal to
+        # a left merge on the submit_at slice followed by drop_duplicates and notnull
+        merged = self.matches(left_frame, on, start, end)
+        return merged.drop_duplicates(subset=["mt_leads_code"]).reset_index(drop=True)
+
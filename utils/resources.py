@@ -0,0 +1,144 @@
+import threading
+import time
+
+import streamlit as st
+
+
+# the google SDKs, gcsfs and requests are imported by the builders below so a
+# page only pays for the clients it actually uses
+
+# seconds between health checks of a pooled resource
+HEALTH_CHECK_INTERVAL = 5 * 60
+
+_MISSING = object()
+
+
+class _Pooled:
+    # one lazily built instance per process, rebuilt when its health check fails
+
+    def __init__(self, factory, healthy=None, interval=HEALTH_CHECK_INTERVAL):
+        self._factory = factory
+        self._healthy = healthy
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._value = _MISSING
+        self._checked_at = 0.0
+
+    def _is_healthy(self):
+        if self._healthy is None or time.monotonic() - self._checked_at < self._interval:
+            return True
+        try:
+            healthy = self._healthy(self._value)
+        except Exception:
+            healthy = False
+        self._checked_at = time.monotonic()
+        return healthy
+
+    def get(self):
+        with self._lock:
+            if self._value is _MISSING or not self._is_healthy():
+                self._close()
+                self._value = self._factory()
+                self._checked_at = time.monotonic()
+            return self._value
+
+    def reset(self):
+        # drop the instance so the next get() reconnects
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        close = getattr(self._value, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception:
+                pass
+        self._value = _MISSING
+
+
+def _build_credentials():
+    from google.oauth2 import service_account
+
+    return service_account.Credentials.from_service_account_info(
+        st.secrets["gcp_service_account"], scopes=["https://www.googleapis.com/auth/cloud-platform"]
+    )
+
+
+def _build_bigquery_client():
+    from google.cloud import bigquery
+
+    return bigquery.Client(credentials=get_credentials())
+
+
+def _bigquery_healthy(client):
+    list(client.list_datasets(max_results=1))
+    return True
+
+
+def _build_filesystem():
+    import gcsfs
+
+    return gcsfs.GCSFileSystem(token=get_credentials())
+
+
+def _build_read_backend():
+    from utils.bq import StorageReadBackend
+
+    try:
+        return StorageReadBackend(credentials=get_credentials())
+    except ImportError:
+        return None
+
+
+def _build_http_session():
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_credentials = _Pooled(_build_credentials)
+_bigquery_client = _Pooled(_build_bigquery_client, healthy=_bigquery_healthy)
+_filesystem = _Pooled(_build_filesystem)
+_read_backend = _Pooled(_build_read_backend)
+_http_session = _Pooled(_build_http_session)
+
+
+def get_credentials():
+    # service account credentials, the access token is refreshed in place when expired
+    credentials = _credentials.get()
+    if not credentials.valid:
+        from google.auth.transport.requests import Request
+
+        credentials.refresh(Request())
+    return credentials
+
+
+def get_bigquery_client():
+    return _bigquery_client.get()
+
+
+def get_filesystem():
+    # gcsfs filesystem for gs:// paths
+    return _filesystem.get()
+
+
+def get_read_backend():
+    # storage read backend, None when google-cloud-bigquery-storage is not installed
+    return _read_backend.get()
+
+
+def get_http_session():
+    # keep-alive session for the integration API
+    return _http_session.get()
+
+
+def reset_resources():
+    # force every pooled resource to reconnect on next use
+    for resource in (_bigquery_client, _filesystem, _read_backend, _http_session, _credentials):
+        resource.reset()
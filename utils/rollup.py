@@ -0,0 +1,62 @@
+import pandas as pd
+
+
+# dimensions of the free text and the crm attribution cubes
+FREE_TEXT_DIMENSIONS = ["create_date", "campaign_source", "adset", "selected"]
+ATTRIBUTION_DIMENSIONS = ["create_date", "campaign_source", "adset", "selected", "m_status_code", "deal"]
+
+
+def _plain_dimensions(frame, dimensions):
+    # frame with its categorical dimensions cast to object
+    categorical = [column for column in dimensions if pd.api.types.is_categorical_dtype(frame[column])]
+    return frame.astype({column: object for column in categorical}) if categorical else frame
+
+
+class Rollup:
+    # row and non-null value counts per combination of dimensions, the first
+    # dimension is the day used for date slicing
+
+    def __init__(self, cells, dimensions):
+        self.cells = cells
+        self.dimensions = dimensions
+
+    @classmethod
+    def from_frame(cls, frame, dimensions, value):
+        # missing dimension values are kept so totals match the raw row count.
+        # groupby drops NaN keys of categoricals even with dropna=False, so
+        # categorical dimensions are grouped as objects
+        frame = _plain_dimensions(frame[dimensions + [value]], dimensions)
+        grouped = frame.groupby(dimensions, dropna=False, sort=False)
+        cells = pd.DataFrame({"rows": grouped.size(), "count": grouped[value].count()}).reset_index()
+        return cls(cells, dimensions)
+
+    def update(self, other):
+        # fold the cells of another rollup (e.g. newly arrived days) into this one
+        cells = _plain_dimensions(pd.concat([self.cells, other.cells], ignore_index=True), self.dimensions)
+        self.cells = cells.groupby(self.dimensions, dropna=False, sort=False)[["rows", "count"]].sum().reset_index()
+        return self
+
+    def slice(self, start, end):
+        # cells of days within [start, end]
+        days = self.cells[self.dimensions[0]]
+        keep = (days >= pd.Timestamp(start)) & (days < pd.Timestamp(end) + pd.Timedelta(days=1))
+        return Rollup(self.cells.loc[keep], self.dimensions)
+
+    def total(self, measure="rows", **filters):
+        cells = self.cells
+        for column, value in filters.items():
+            cells = cells.loc[cells[column] == value]
+        return int(cells[measure].sum())
+
+    def group(self, by, measure="count"):
+        # same result as frame.groupby(by)[value].count() on the raw rows
+        cells = self.cells.dropna(subset=by)
+        return cells.groupby(by, observed=True)[measure].sum().reset_index(name="count")
+
+
+def free_text_rollup(dataframe):
+    return Rollup.from_frame(dataframe, FREE_TEXT_DIMENSIONS, "phone")
+
+
+def attribution_rollup(dataframe):
+    return Rollup.from_frame(dataframe, ATTRIBUTION_DIMENSIONS, "mt_leads_code")
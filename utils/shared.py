@@ -0,0 +1,128 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def _freeze_array(values):
+    # mark the buffers behind a column read-only
+    for attribute in ("_codes", "_ndarray", "_data", "_mask"):
+        inner = getattr(values, attribute, None)
+        if isinstance(inner, np.ndarray):
+            inner.flags.writeable = False
+    if isinstance(values, np.ndarray):
+        values.flags.writeable = False
+
+
+def freeze(frame):
+    # make every column buffer of frame read-only, in-place writes then raise
+    for block in frame._mgr.blocks:
+        _freeze_array(block.values)
+    return frame
+
+
+class DayIndex:
+    # day offsets of a date column sorted newest first (missing dates last), any
+    # [start, end] range of days is then a positional slice found by searchsorted
+
+    def __init__(self, dates):
+        days = pd.DatetimeIndex(dates).to_numpy(dtype="datetime64[D]")
+        self.valid = int((~np.isnat(days)).sum())
+        self.first = days[0] if self.valid else np.datetime64("NaT", "D")
+        # days before the newest one, ascending along the rows
+        self.offsets = (self.first - days[:self.valid]).astype("int64")
+
+    def slice(self, start=None, end=None):
+        # rows with start <= date <= end, open ends are unbounded
+        if not self.valid:
+            return slice(0, 0)
+        lo = 0 if end is None else np.searchsorted(
+            self.offsets, (self.first - np.datetime64(end, "D")).astype("int64"), side="left")
+        hi = self.valid if start is None else np.searchsorted(
+            self.offsets, (self.first - np.datetime64(start, "D")).astype("int64"), side="right")
+        return slice(int(lo), int(max(lo, hi)))
+
+
+class SharedFrame:
+    # one read-only frame shared by every session of the process. sessions get
+    # shallow views (own column index, shared buffers) so adding columns stays
+    # local to the session while writing into shared data raises. derived
+    # values are computed once and kept with the frame. with a date column the
+    # frame is sorted by it once, newest first like the dashboard query always
+    # returned it, so date ranges are sliced without a scan. the sort is stable,
+    # rows of a day keep their order
+
+    def __init__(self, frame, version=None, date=None):
+        if date is not None:
+            frame = frame.sort_values(date, ascending=False, kind="stable", na_position="last")
+        self._frame = freeze(frame)
+        self.version = version
+        self.days = DayIndex(frame[date]) if date is not None else None
+        self._derived = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._frame)
+
+    @property
+    def columns(self):
+        return self._frame.columns
+
+    def view(self, rows=None, columns=None, start=None, end=None):
+        # cheap view of the selected rows (slice, positions or boolean mask) and
+        # columns, start and end first narrow it to a range of days
+        frame = self._frame if columns is None else self._frame[columns]
+        if start is not None or end is not None:
+            frame = frame.iloc[self.days.slice(start, end)]
+        if rows is not None:
+            is_mask = getattr(rows, "dtype", None) == bool
+            frame = frame.loc[rows] if is_mask else frame.iloc[rows]
+        return frame.copy(deep=False)
+
+    def derived(self, name, compute):
+        # compute(frame) once per shared frame, concurrent callers wait for the first
+        with self._lock:
+            if name not in self._derived:
+                value = compute(self._frame)
+                if isinstance(value, pd.DataFrame):
+                    value = freeze(value)
+                elif isinstance(value, pd.Series):
+                    _freeze_array(value._values)
+                self._derived[name] = value
+            return self._derived[name]
+
+
+class SharedDataset:
+    # process-wide holder of the latest SharedFrame returned by loader, reloaded
+    # once it is older than ttl. sessions keep using the previous frame while
+    # one of them reloads
+
+    def __init__(self, loader, ttl, version=None, date=None):
+        self._loader = loader
+        self._ttl = ttl
+        self._version = version or (lambda frame: len(frame))
+        self._date = date
+        self._shared = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        expired = time.monotonic() - self._loaded_at >= self._ttl
+        if self._shared is not None and not expired:
+            return self._shared
+        # only one caller reloads, the others serve the current frame if there is one
+        if not self._lock.acquire(blocking=self._shared is None):
+            return self._shared
+        try:
+            if self._shared is None or time.monotonic() - self._loaded_at >= self._ttl:
+                frame = self._loader()
+                self._shared = SharedFrame(frame, version=self._version(frame), date=self._date)
+                self._loaded_at = time.monotonic()
+            return self._shared
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        with self._lock:
+            self._shared = None
@@ -0,0 +1,303 @@
+import contextlib
+import fcntl
+import functools
+import hashlib
+import os
+import struct
+import tempfile
+import threading
+import time
+import uuid
+
+import pyarrow as pa
+
+
+# SHARED_CACHE_URL selects the backend shared by every process: a directory
+# (default, put it on a volume mounted by every replica), redis://host:port/db,
+# or memory:// for a single process
+SHARED_CACHE_URL = os.environ.get("SHARED_CACHE_URL", os.path.join(tempfile.gettempdir(), "free-text-v3", "shared-cache"))
+
+# seconds a process waits for another one rebuilding the same entry
+LOCK_TIMEOUT = 10 * 60
+
+# seconds between attempts to take a held lock
+LOCK_POLL = 0.05
+
+# seconds an entry stored without a max age is kept on disk
+DEFAULT_MAX_AGE = 24 * 60 * 60
+
+# seconds between sweeps of expired entries by one process
+SWEEP_INTERVAL = 10 * 60
+
+# schema metadata key holding the time after which an entry may be deleted
+EXPIRES_AT = b"shared_cache.expires_at"
+
+
+def _to_ipc(frame, expires_at=None):
+    sink = pa.BufferOutputStream()
+    table = pa.Table.from_pandas(frame)
+    if expires_at is not None:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), EXPIRES_AT: repr(expires_at).encode()})
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def _from_ipc(source):
+    return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+class DiskBackend:
+    # one Arrow IPC file per entry and a flock-ed lock file next to it, shared by
+    # every process that mounts directory. entries past their max age are deleted
+    # together with their lock file by the next write after SWEEP_INTERVAL
+
+    def __init__(self, directory=SHARED_CACHE_URL, max_age=DEFAULT_MAX_AGE, sweep_interval=SWEEP_INTERVAL):
+        self.directory = directory
+        self.max_age = max_age
+        self.sweep_interval = sweep_interval
+        self._swept_at = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name, suffix):
+        return os.path.join(self.directory, f"{name}{suffix}")
+
+    def read(self, name):
+        # (frame, stored_at) or None
+        path = self._path(name, ".arrow")
+        try:
+            stored_at = os.path.getmtime(path)
+            with pa.OSFile(path) as source:
+                return _from_ipc(source), stored_at
+        except FileNotFoundError:
+            return None
+
+    def write(self, name, frame, max_age=None):
+        # write next to the target and rename so readers never see a partial file
+        expires_at = time.time() + (self.max_age if max_age is None else max_age)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(_to_ipc(frame, expires_at))
+            os.replace(tmp, self._path(name, ".arrow"))
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+        if self._swept_at is None or time.monotonic() - self._swept_at >= self.sweep_interval:
+            self._swept_at = time.monotonic()
+            self.sweep()
+
+    def _expires_at(self, path):
+        # expiry stored with the entry, entries written without one expire max_age after their write
+        try:
+            with pa.memory_map(path) as source:
+                metadata = pa.ipc.open_file(source).schema.metadata or {}
+            if EXPIRES_AT in metadata:
+                return float(metadata[EXPIRES_AT])
+            return os.path.getmtime(path) + self.max_age
+        except (FileNotFoundError, pa.ArrowInvalid):
+            return None
+
+    def sweep(self, now=None):
+        # delete expired entries with their lock files, unheld lock files without an
+        # entry and temporary files of crashed writers. returns the number of entries deleted
+        now = time.time() if now is None else now
+        removed = 0
+        for file_name in os.listdir(self.directory):
+            name, suffix = os.path.splitext(file_name)
+            path = os.path.join(self.directory, file_name)
+            if suffix == ".arrow":
+                expires_at = self._expires_at(path)
+                if expires_at is None or expires_at > now:
+                    continue
+                # skip entries another process is rebuilding right now
+                handle = self.acquire(name, timeout=0)
+                if handle is None:
+                    continue
+                try:
+                    # the entry may have been rewritten since it was checked
+                    expires_at = self._expires_at(path)
+                    if expires_at is not None and expires_at <= now:
+                        os.remove(path)
+                        os.remove(self._path(name, ".lock"))
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+                finally:
+                    self.release(handle)
+            elif suffix == ".lock" and not os.path.exists(self._path(name, ".arrow")):
+                # a process waiting on a lock file deleted meanwhile can at worst
+                # rebuild the entry a second time, writes stay atomic
+                handle = self.acquire(name, timeout=0)
+                if handle is None:
+                    continue
+                try:
+                    if not os.path.exists(self._path(name, ".arrow")):
+                        os.remove(path)
+                except FileNotFoundError:
+                    pass
+                finally:
+                    self.release(handle)
+            elif suffix == ".tmp":
+                with contextlib.suppress(FileNotFoundError):
+                    if now - os.path.getmtime(path) > LOCK_TIMEOUT:
+                        os.remove(path)
+        return removed
+
+    def acquire(self, name, timeout):
+        # lock handle, or None when another process still holds it after timeout
+        file = open(self._path(name, ".lock"), "a")
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return file
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    file.close()
+                    return None
+                time.sleep(LOCK_POLL)
+
+    def release(self, handle):
+        fcntl.flock(handle, fcntl.LOCK_UN)
+        handle.close()
+
+
+class RedisBackend:
+    # entries and locks in a redis-compatible server (redis.Redis or FakeRedis),
+    # values are the store time followed by the Arrow IPC bytes of the frame
+
+    def __init__(self, client, prefix="free-text-v3", lock_ttl=LOCK_TIMEOUT):
+        self.client = client
+        self.prefix = prefix
+        self.lock_ttl = lock_ttl
+
+    def read(self, name):
+        value = self.client.get(f"{self.prefix}:{name}")
+        if value is None:
+            return None
+        (stored_at,) = struct.unpack_from("d", value)
+        return _from_ipc(pa.BufferReader(value[8:])), stored_at
+
+    def write(self, name, frame, max_age=None):
+        # the server deletes the entry once it is older than max_age
+        value = struct.pack("d", time.time()) + _to_ipc(frame).to_pybytes()
+        self.client.set(f"{self.prefix}:{name}", value, px=None if max_age is None else int(max_age * 1000))
+
+    def acquire(self, name, timeout):
+        # the lock expires after lock_ttl so a crashed holder cannot block others forever
+        key, token = f"{self.prefix}:{name}:lock", uuid.uuid4().hex
+        deadline = time.monotonic() + timeout
+        while not self.client.set(key, token, nx=True, px=int(self.lock_ttl * 1000)):
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(LOCK_POLL)
+        return key, token
+
+    def release(self, handle):
+        key, token = handle
+        value = self.client.get(key)
+        if value is not None and (value.decode() if isinstance(value, bytes) else value) == token:
+            self.client.delete(key)
+
+
+class FakeRedis:
+    # in-process stand-in for a redis server supporting the calls RedisBackend makes
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        value, expires = self._values.get(key, (None, None))
+        if expires is not None and time.monotonic() >= expires:
+            del self._values[key]
+            return None
+        return value
+
+    def get(self, key):
+        with self._lock:
+            value = self._live(key)
+            return value.encode() if isinstance(value, str) else value
+
+    def set(self, key, value, nx=False, px=None):
+        with self._lock:
+            if nx and self._live(key) is not None:
+                return None
+            self._values[key] = (value, None if px is None else time.monotonic() + px / 1000)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            return int(self._values.pop(key, None) is not None)
+
+
+@functools.lru_cache(maxsize=None)
+def default_backend(url=SHARED_CACHE_URL):
+    # backend named by url, one per process
+    if url.startswith(("redis://", "rediss://")):
+        import redis
+
+        return RedisBackend(redis.Redis.from_url(url))
+    if url == "memory://":
+        return RedisBackend(FakeRedis())
+    return DiskBackend(url)
+
+
+class SharedCache:
+    # cache of frames returned by loader(key) shared by every process using the
+    # same backend. only one process rebuilds a missing or expired entry: the
+    # others wait for it, or keep serving the entry while it is younger than
+    # ttl + stale_ttl
+
+    def __init__(self, loader, ttl, stale_ttl=0, backend=None, namespace="", lock_timeout=LOCK_TIMEOUT):
+        self._loader = loader
+        self._ttl = ttl
+        self._stale_ttl = stale_ttl
+        self._backend = backend or default_backend()
+        self._namespace = namespace
+        self._lock_timeout = lock_timeout
+
+    def _name(self, key):
+        return hashlib.sha1(repr((self._namespace, key)).encode()).hexdigest()
+
+    @contextlib.contextmanager
+    def _locked(self, name, timeout):
+        handle = self._backend.acquire(name, timeout)
+        try:
+            yield handle is not None
+        finally:
+            if handle is not None:
+                self._backend.release(handle)
+
+    def _fresh(self, entry):
+        return entry is not None and time.time() - entry[1] < self._ttl
+
+    def get(self, key):
+        name = self._name(key)
+        entry = self._backend.read(name)
+        if self._fresh(entry):
+            return entry[0]
+
+        if entry is not None and time.time() - entry[1] < self._ttl + self._stale_ttl:
+            # stale: refresh only if no other process is already doing so
+            with self._locked(name, timeout=0) as acquired:
+                if not acquired:
+                    return entry[0]
+                return self._rebuild(key, name)
+
+        with self._locked(name, timeout=self._lock_timeout) as acquired:
+            if not acquired and entry is not None:
+                return entry[0]
+            return self._rebuild(key, name)
+
+    def _rebuild(self, key, name):
+        # the process that held the lock before may just have stored the entry
+        entry = self._backend.read(name)
+        if self._fresh(entry):
+            return entry[0]
+        frame = self._loader(key)
+        # past ttl + stale_ttl an entry is never served again, so the backend may delete it
+        self._backend.write(name, frame, max_age=self._ttl + self._stale_ttl)
+        return frame
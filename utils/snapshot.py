@@ -0,0 +1,175 @@
+import glob
+import hashlib
+import os
+import tempfile
+
+import fsspec
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+# local directory holding the parquet snapshots
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", os.path.join(tempfile.gettempdir(), "free-text-v3", "snapshots"))
+
+
+def object_version(fs, path):
+    # GCS objects expose a generation/etag, other filesystems (e.g. a local
+    # directory standing in for the bucket) fall back to a checksum of size and mtime
+    info = fs.info(path)
+    version = info.get("generation") or info.get("etag") or fs.checksum(path)
+    return hashlib.sha1(str(version).encode()).hexdigest()[:16]
+
+
+def _snapshot_prefix(url, cache_dir):
+    return os.path.join(cache_dir, hashlib.sha1(url.encode()).hexdigest()[:16])
+
+
+def _latest_snapshot(prefix):
+    snapshots = glob.glob(f"{prefix}-*.parquet")
+    return max(snapshots, key=os.path.getmtime) if snapshots else None
+
+
+def _write_snapshot(dataframe, snapshot, cache_dir):
+    # write next to the target and rename so readers never see a partial file
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    os.close(fd)
+    try:
+        dataframe.to_parquet(tmp, index=False)
+        os.replace(tmp, snapshot)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _protocols(fs):
+    return (fs.protocol,) if isinstance(fs.protocol, str) else tuple(fs.protocol)
+
+
+def resolve_url(target, filesystem=None, storage_options=None):
+    # (filesystem, path) of target, reusing filesystem when it serves target's protocol
+    if filesystem is not None and fsspec.utils.get_protocol(target) in _protocols(filesystem):
+        return filesystem, filesystem._strip_protocol(target)
+    return fsspec.core.url_to_fs(target, **(storage_options or {}))
+
+
+def _remove_stale(prefix, snapshot):
+    # drop snapshots of older versions
+    for stale in glob.glob(f"{prefix}-*.parquet"):
+        if stale != snapshot:
+            os.remove(stale)
+
+
+def upsert(previous, delta, key):
+    # replace rows of previous sharing a key with delta and append the new ones.
+    # the delta is compacted on its own rows and may pick other dtypes, the
+    # stored frame's dtypes win so the snapshot keeps its schema
+    for column in previous.columns:
+        if column not in delta:
+            continue
+        if pd.api.types.is_categorical_dtype(previous[column]):
+            # align categories so the concat below keeps the categorical dtype
+            categories = previous[column].cat.categories
+            incoming = pd.Index(delta[column].dropna().unique())
+            categories = categories.append(incoming.difference(categories))
+            previous[column] = previous[column].cat.set_categories(categories)
+            delta[column] = delta[column].astype(pd.CategoricalDtype(categories))
+        elif pd.api.types.is_categorical_dtype(delta[column]):
+            # stored uncategorized, e.g. mostly distinct text over the full history
+            delta[column] = delta[column].to_numpy()
+
+    unchanged = previous.loc[~previous[key].isin(delta[key])]
+    return pd.concat([unchanged, delta], ignore_index=True)
+
+
+def load_snapshot(url, build, columns=None, storage_options=None, cache_dir=None,
+                  key=None, watermark=None, delta_url=None, filesystem=None):
+    # read `build(file)` of the object at url from a local parquet snapshot, the
+    # object is only downloaded again when its version changes.
+    #
+    # with key and watermark set, a changed source is applied incrementally: only
+    # rows whose watermark is at or after the previous snapshot's maximum are built
+    # (via `build(file, since=...)`, read from delta_url when given) and upserted
+    # by key. rows deleted upstream are kept until the snapshot dir is cleared.
+    #
+    # a prebuilt filesystem (e.g. the process-wide gcsfs instance) can be passed
+    # instead of storage_options when url and delta_url share its protocol.
+    cache_dir = cache_dir or SNAPSHOT_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    storage_options = storage_options or {}
+
+    def resolve(target):
+        return resolve_url(target, filesystem, storage_options)
+
+    fs, path = resolve(url)
+    version = object_version(fs, path)
+    if delta_url:
+        delta_fs, delta_path = resolve(delta_url)
+        version = hashlib.sha1((version + object_version(delta_fs, delta_path)).encode()).hexdigest()[:16]
+    else:
+        delta_fs, delta_path = fs, path
+
+    prefix = _snapshot_prefix(url, cache_dir)
+    snapshot = f"{prefix}-{version}.parquet"
+
+    if not os.path.exists(snapshot):
+        previous = _latest_snapshot(prefix) if key and watermark else None
+
+        if previous:
+            dataframe = pd.read_parquet(previous)
+            since = dataframe[watermark].max()
+            with delta_fs.open(delta_path, "rb") as file:
+                delta = build(file, since=since)
+            dataframe = upsert(dataframe, delta, key)
+        else:
+            with fs.open(path, "rb") as file:
+                dataframe = build(file)
+
+        _write_snapshot(dataframe, snapshot, cache_dir)
+        del dataframe
+
+        _remove_stale(prefix, snapshot)
+
+    return pd.read_parquet(snapshot, columns=columns, memory_map=True)
+
+
+def stream_snapshot(url, build_batches, storage_options=None, cache_dir=None, filesystem=None):
+    # path of a local parquet snapshot of the object at url written batch by
+    # batch from `build_batches(file)`, a generator of frames with the same
+    # columns, so the source never has to fit in memory. rebuilt when the
+    # object's version changes; readers prune columns and rows on read
+    cache_dir = cache_dir or SNAPSHOT_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    fs, path = resolve_url(url, filesystem, storage_options)
+
+    prefix = _snapshot_prefix(url, cache_dir)
+    snapshot = f"{prefix}-{object_version(fs, path)}.parquet"
+    if os.path.exists(snapshot):
+        return snapshot
+
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    os.close(fd)
+    writer = None
+    try:
+        with fs.open(path, "rb") as file:
+            for batch in build_batches(file):
+                if writer is None:
+                    # columns without a value in the first batch are stored as text
+                    schema = pa.Schema.from_pandas(batch, preserve_index=False)
+                    for i, field in enumerate(schema):
+                        if pa.types.is_null(field.type):
+                            schema = schema.set(i, field.with_type(pa.string()))
+                    writer = pq.ParquetWriter(tmp, schema)
+                writer.write_table(pa.Table.from_pandas(batch, schema=schema, preserve_index=False))
+        if writer is None:
+            raise ValueError(f"{url} has no rows")
+        writer.close()
+        os.replace(tmp, snapshot)
+    finally:
+        if writer is not None and writer.is_open:
+            writer.close()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+    _remove_stale(prefix, snapshot)
+    return snapshot
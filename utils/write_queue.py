@@ -0,0 +1,196 @@
+import glob
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from utils.bq import FREE_TEXT_TABLE
+from utils.writer import write_leads
+
+
+# local directory keeping submitted frames until they are committed
+SPOOL_DIR = os.environ.get("WRITE_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "free-text-v3", "spool"))
+
+# seconds to wait for more submissions before writing, and retry backoff bounds
+LINGER = 2.0
+RETRY_BACKOFF = 5.0
+MAX_BACKOFF = 5 * 60
+
+# failed writes of a spool file before it is moved to the dead letter directory
+MAX_ATTEMPTS = 5
+
+# directory below the spool keeping files that failed MAX_ATTEMPTS times, per target
+DEAD_LETTER = "dead-letter"
+
+
+class WriteQueue:
+    # background writer: submissions are spooled to disk and return immediately,
+    # a worker thread coalesces every pending submission of a target into one
+    # idempotent write and retries failures with backoff. files of a failed write
+    # are retried one at a time so a bad submission cannot hold back the others,
+    # and moved to the dead letter directory after max_attempts failures.
+    # spooled submissions of a previous process are picked up again on start
+
+    def __init__(self, sink_factory, spool_dir=None, linger=LINGER, max_attempts=MAX_ATTEMPTS):
+        self._sink_factory = sink_factory
+        self._spool_dir = spool_dir or SPOOL_DIR
+        self._linger = linger
+        self._max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending = {}  # target -> [(spool path, rows)]
+        self._attempts = {}  # spool path -> failed writes
+        self.queued = 0
+        self.in_flight = 0
+        self.committed = 0
+        self.inserted = 0
+        self.failures = 0
+        self.dead_letter = 0
+        self.last_error = None
+
+        for path in sorted(glob.glob(os.path.join(self._spool_dir, "*", "*.parquet"))):
+            target = os.path.basename(os.path.dirname(path))
+            rows = pq.ParquetFile(path).metadata.num_rows
+            self._pending.setdefault(target, []).append((path, rows))
+            self.queued += rows
+        for path in glob.glob(os.path.join(self._spool_dir, DEAD_LETTER, "*", "*.parquet")):
+            self.dead_letter += pq.ParquetFile(path).metadata.num_rows
+
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+        if self._pending:
+            self._wakeup.set()
+
+    def submit(self, frame, target=FREE_TEXT_TABLE):
+        # spool frame for target and return at once
+        if frame.empty:
+            return
+        directory = os.path.join(self._spool_dir, target)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{time.time_ns()}-{uuid.uuid4().hex}.parquet")
+        tmp = path + ".tmp"
+        frame.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+
+        with self._lock:
+            self._pending.setdefault(target, []).append((path, len(frame)))
+            self.queued += len(frame)
+        self._wakeup.set()
+
+    def status(self):
+        with self._lock:
+            return {
+                "queued": self.queued,
+                "in_flight": self.in_flight,
+                "committed": self.committed,
+                "inserted": self.inserted,
+                "failures": self.failures,
+                "dead_letter": self.dead_letter,
+                "dead_letter_dir": os.path.join(self._spool_dir, DEAD_LETTER),
+                "last_error": self.last_error,
+            }
+
+    def _take(self):
+        # [(target, entries)] to write: new submissions of a target coalesced into
+        # one batch, files that failed before each in a batch of their own
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            batches = []
+            for target, entries in pending.items():
+                retried = [entry for entry in entries if entry[0] in self._attempts]
+                fresh = [entry for entry in entries if entry[0] not in self._attempts]
+                batches += [(target, [entry]) for entry in retried]
+                if fresh:
+                    batches.append((target, fresh))
+                rows = sum(rows for _, rows in entries)
+                self.queued -= rows
+                self.in_flight += rows
+            return batches
+
+    def _requeue(self, target, entries):
+        # count the failure of every file, files failing max_attempts times are set aside
+        retry, dead = [], []
+        with self._lock:
+            for path, rows in entries:
+                self._attempts[path] = self._attempts.get(path, 0) + 1
+                (dead if self._attempts[path] >= self._max_attempts else retry).append((path, rows))
+            self._pending[target] = retry + self._pending.get(target, [])
+            self.in_flight -= sum(rows for _, rows in entries)
+            self.queued += sum(rows for _, rows in retry)
+
+        for path, rows in dead:
+            directory = os.path.join(self._spool_dir, DEAD_LETTER, target)
+            os.makedirs(directory, exist_ok=True)
+            try:
+                os.replace(path, os.path.join(directory, os.path.basename(path)))
+            except FileNotFoundError:
+                # committed by another replica meanwhile
+                rows = 0
+            with self._lock:
+                self._attempts.pop(path, None)
+                self.dead_letter += rows
+
+    def _run(self):
+        backoff = RETRY_BACKOFF
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            # let concurrent sessions add to the batch
+            time.sleep(self._linger)
+
+            failed = False
+            for target, entries in self._take():
+                rows = sum(rows for _, rows in entries)
+                try:
+                    # another replica sharing the spool may have committed some already
+                    paths = [path for path, _ in entries if os.path.exists(path)]
+                    if paths:
+                        frame = pd.concat([pd.read_parquet(path) for path in paths], ignore_index=True)
+                        inserted = write_leads(self._sink_factory(), frame, target=target)
+                    else:
+                        # every file of the batch is gone, nothing left to write
+                        inserted = 0
+                except Exception as error:
+                    failed = True
+                    with self._lock:
+                        self.failures += 1
+                        self.last_error = repr(error)
+                    self._requeue(target, entries)
+                    continue
+
+                for path, _ in entries:
+                    if os.path.exists(path):
+                        os.remove(path)
+                with self._lock:
+                    for path, _ in entries:
+                        self._attempts.pop(path, None)
+                    self.in_flight -= rows
+                    self.committed += rows
+                    self.inserted += inserted
+
+            if failed:
+                time.sleep(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+                self._wakeup.set()
+            else:
+                backoff = RETRY_BACKOFF
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_write_queue():
+    # process-wide queue writing to BigQuery through the pooled client
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            from utils.resources import get_bigquery_client
+            from utils.writer import BigQuerySink
+
+            _queue = WriteQueue(lambda: BigQuerySink(get_bigquery_client()))
+        return _queue
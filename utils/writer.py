@@ -0,0 +1,122 @@
+import datetime
+import uuid
+
+import pandas as pd
+
+from utils.bq import FREE_TEXT_TABLE
+
+
+# a lead is identified by its phone, creation time and campaign
+KEY_COLUMNS = ["phone", "create_date", "campaign_name"]
+
+# rows per parquet load batch
+BATCH_ROWS = 100_000
+
+# staging tables expire on their own when the process dies before dropping them
+STAGING_TTL = datetime.timedelta(days=1)
+
+
+def _key_frame(frame, key_columns):
+    # key columns as text, missing values as empty strings, the same way the MERGE compares them
+    return frame[key_columns].astype(object).where(frame[key_columns].notna(), "").astype(str)
+
+
+def lead_ids(frame, key_columns=None):
+    # stable uint64 id of every lead, equal for rows write_leads treats as duplicates
+    return pd.Index(pd.util.hash_pandas_object(_key_frame(frame, key_columns or KEY_COLUMNS), index=False).to_numpy(),
+                    name="lead_id")
+
+
+class BigQuerySink:
+    # stages frames with parquet load jobs and merges them into the target table
+
+    def __init__(self, client):
+        self.client = client
+
+    def stage(self, target, frame):
+        from google.cloud import bigquery
+
+        staging = f"{target}__staging_{uuid.uuid4().hex}"
+        # reuse the target column types so the merge compares like with like
+        schema = [field for field in self.client.get_table(target).schema if field.name in frame.columns]
+        # created with an expiration before any load, loads only append to it
+        table = bigquery.Table(staging, schema=schema)
+        table.expires = datetime.datetime.now(datetime.timezone.utc) + STAGING_TTL
+        self.client.create_table(table)
+        for offset in range(0, max(len(frame), 1), BATCH_ROWS):
+            job_config = bigquery.LoadJobConfig(
+                schema=schema,
+                source_format=bigquery.SourceFormat.PARQUET,
+                write_disposition="WRITE_APPEND",
+            )
+            batch = frame.iloc[offset:offset + BATCH_ROWS]
+            # categoricals are loaded as plain values of the target column type
+            batch = batch.astype({column: object for column in batch.columns
+                                  if pd.api.types.is_categorical_dtype(batch[column])})
+            self.client.load_table_from_dataframe(batch, staging, job_config=job_config).result()
+        return staging
+
+    def merge(self, staging, target, key_columns, columns):
+        # insert staged rows whose key is not in the target yet, duplicates within
+        # the batch collapse to one row
+        def key(alias, column):
+            return f"IFNULL(CAST({alias}.`{column}` AS STRING), '')"
+
+        on = " AND ".join(f"{key('T', column)} = {key('S', column)}" for column in key_columns)
+        partition = ", ".join(key("s", column) for column in key_columns)
+        names = ", ".join(f"`{column}`" for column in columns)
+        sql = (
+            f"MERGE `{target}` T "
+            f"USING (SELECT * EXCEPT(_rn) FROM (SELECT s.*, ROW_NUMBER() OVER (PARTITION BY {partition}) AS _rn "
+            f"FROM `{staging}` s) WHERE _rn = 1) S "
+            f"ON {on} "
+            f"WHEN NOT MATCHED THEN INSERT ({names}) VALUES ({names})"
+        )
+        job = self.client.query(sql)
+        job.result()
+        return job.num_dml_affected_rows or 0
+
+    def drop(self, staging):
+        self.client.delete_table(staging, not_found_ok=True)
+
+
+class MemorySink:
+    # in-process stand-in for BigQuerySink keeping tables as dataframes
+
+    def __init__(self, tables=None):
+        self.tables = tables if tables is not None else {}
+
+    def stage(self, target, frame):
+        staging = f"{target}__staging_{uuid.uuid4().hex}"
+        self.tables[staging] = frame.copy()
+        return staging
+
+    def merge(self, staging, target, key_columns, columns):
+        staged = self.tables[staging]
+        current = self.tables.get(target, pd.DataFrame(columns=columns))
+        staged_keys = _key_frame(staged, key_columns)
+        existing = pd.MultiIndex.from_frame(_key_frame(current, key_columns)) if len(current) else None
+        new = ~staged_keys.duplicated().to_numpy()
+        if existing is not None:
+            new &= ~pd.MultiIndex.from_frame(staged_keys).isin(existing)
+        self.tables[target] = pd.concat([current, staged.loc[new, columns]], ignore_index=True)
+        return int(new.sum())
+
+    def drop(self, staging):
+        self.tables.pop(staging, None)
+
+
+def write_leads(sink, frame, target=FREE_TEXT_TABLE, key_columns=None):
+    # idempotently append leads to target, rows whose key is already stored are
+    # skipped so double clicks and reruns never duplicate leads. returns the
+    # number of inserted rows
+    key_columns = key_columns or KEY_COLUMNS
+    frame = frame.loc[~_key_frame(frame, key_columns).duplicated()]
+    if frame.empty:
+        return 0
+
+    staging = sink.stage(target, frame)
+    try:
+        return sink.merge(staging, target, key_columns, list(frame.columns))
+    finally:
+        sink.drop(staging)